@@ -61,4 +61,6 @@ Parser:
 
 Writer:
 - write tests
-"""
\ No newline at end of file
+"""
+
+__version__ = "0.1"
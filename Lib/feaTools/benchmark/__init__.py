@@ -0,0 +1,16 @@
+"""
+Benchmarks for the parser and the writers.
+
+The corpora module makes large synthetic feature files and
+the harness module times the parser and writers on them and
+measures their peak memory use. Results are plain dictionaries
+that can be stored as JSON and compared with the results of
+another release. From the command line:
+
+    python -m feaTools.benchmark --scale 0.1 --output new.json
+    python -m feaTools.benchmark --compare old.json
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+from .corpora import makeCorpus, kerningCorpus, ligatureCorpus, contextualCorpus, lookupCorpus
+from .harness import runBenchmarks, writeResults, readResults, compareResults
@@ -0,0 +1,35 @@
+from __future__ import print_function, division, absolute_import, unicode_literals
+import argparse
+import json
+import sys
+from .corpora import corpora
+from .harness import benchmarks, runBenchmarks, writeResults, readResults, compareResults
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="feaTools.benchmark", description="Benchmark the feaTools parser and writers.")
+    parser.add_argument("--benchmark", action="append", choices=sorted(benchmarks), help="a benchmark to run. all of them by default.")
+    parser.add_argument("--corpus", action="append", choices=sorted(corpora), help="a corpus to run on. all of them by default.")
+    parser.add_argument("--scale", type=float, default=1.0, help="a factor for the corpus sizes.")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of timed runs.")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="don't measure peak memory.")
+    parser.add_argument("--output", help="a path for the JSON results. they are printed otherwise.")
+    parser.add_argument("--compare", help="a path to earlier JSON results to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="the growth that counts as a regression.")
+    args = parser.parse_args(args)
+    results = runBenchmarks(args.benchmark, args.corpus, scale=args.scale, repeat=args.repeat, memory=args.memory)
+    if args.output:
+        writeResults(results, args.output)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    if args.compare:
+        regressions = compareResults(readResults(args.compare), results, args.tolerance)
+        for benchmark, corpus, measurement, oldValue, newValue in regressions:
+            print("%s on %s: %s went from %r to %r" % (benchmark, corpus, measurement, oldValue, newValue), file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
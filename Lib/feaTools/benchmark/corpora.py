@@ -0,0 +1,146 @@
+"""
+Generators for large synthetic feature files.
+
+Each function returns FDK syntax text that looks like the
+features of a big font. The same arguments always give the
+same text, so results can be compared between runs.
+
+    text = kerningCorpus(pairCount=100000)
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+import random
+
+
+def _glyphNames(count, prefix="glyph"):
+    return ["%s%05d" % (prefix, i) for i in range(count)]
+
+def _classDefinitions(glyphNames, classCount, classSize, prefix, randomizer):
+    lines = []
+    names = []
+    for i in range(classCount):
+        name = "@%s_%d" % (prefix, i)
+        members = randomizer.sample(glyphNames, classSize)
+        lines.append("%s = [%s];" % (name, " ".join(members)))
+        names.append(name)
+    return names, lines
+
+def kerningCorpus(pairCount=100000, glyphCount=1000, classCount=200, classSize=8, seed=1):
+    """
+    A kern feature with pairCount pos rules. A quarter of the
+    pairs are class pairs, a quarter mix a glyph and a class
+    with enum and the rest are glyph pairs. Every tenth pair
+    has an inline class.
+    """
+    randomizer = random.Random(seed)
+    glyphNames = _glyphNames(glyphCount)
+    leftClasses, lines = _classDefinitions(glyphNames, classCount, classSize, "kern1", randomizer)
+    rightClasses, rightLines = _classDefinitions(glyphNames, classCount, classSize, "kern2", randomizer)
+    lines.extend(rightLines)
+    lines.append("feature kern {")
+    for i in range(pairCount):
+        value = randomizer.randint(-150, 50)
+        kind = i % 4
+        if kind == 0:
+            left = randomizer.choice(leftClasses)
+            right = randomizer.choice(rightClasses)
+            lines.append("    pos %s %s %d;" % (left, right, value))
+        elif kind == 1:
+            left = randomizer.choice(glyphNames)
+            right = randomizer.choice(rightClasses)
+            lines.append("    enum pos %s %s %d;" % (left, right, value))
+        else:
+            left = randomizer.choice(glyphNames)
+            right = randomizer.choice(glyphNames)
+            if i % 10 == 2:
+                right = "[%s]" % " ".join(randomizer.sample(glyphNames, 3))
+            lines.append("    pos %s %s %d;" % (left, right, value))
+    lines.append("} kern;")
+    return "\n".join(lines)
+
+def ligatureCorpus(ligatureCount=5000, glyphCount=500, seed=1):
+    """
+    A liga feature with ligatureCount sub ... by rules
+    of two to four glyphs.
+    """
+    randomizer = random.Random(seed)
+    glyphNames = _glyphNames(glyphCount)
+    lines = ["feature liga {"]
+    for i in range(ligatureCount):
+        components = randomizer.sample(glyphNames, randomizer.randint(2, 4))
+        lines.append("    sub %s by %s;" % (" ".join(components), "_".join(components)))
+    lines.append("} liga;")
+    return "\n".join(lines)
+
+def contextualCorpus(ruleCount=5000, depth=6, glyphCount=500, seed=1):
+    """
+    A calt feature with ruleCount chained contextual rules.
+    Each rule has up to depth glyphs of backtrack and lookahead
+    context, and some of the context glyphs are inline classes.
+    Every fifth rule is an ignore rule.
+    """
+    randomizer = random.Random(seed)
+    glyphNames = _glyphNames(glyphCount)
+
+    def context(count):
+        items = []
+        for i in range(count):
+            if randomizer.random() < 0.2:
+                items.append("[%s]" % " ".join(randomizer.sample(glyphNames, 3)))
+            else:
+                items.append(randomizer.choice(glyphNames))
+        return items
+
+    lines = ["feature calt {"]
+    for i in range(ruleCount):
+        backtrack = context(randomizer.randint(0, depth))
+        lookahead = context(randomizer.randint(0, depth))
+        target = randomizer.choice(glyphNames)
+        marked = backtrack + [target + "'"] + lookahead
+        if i % 5 == 4:
+            lines.append("    ignore sub %s;" % " ".join(marked))
+        else:
+            lines.append("    sub %s by %s.alt;" % (" ".join(marked), target))
+    lines.append("} calt;")
+    return "\n".join(lines)
+
+def lookupCorpus(lookupCount=2000, rulesPerLookup=10, glyphCount=500, seed=1):
+    """
+    lookupCount named lookups with single substitutions
+    and lookup flags, referenced from a few features.
+    """
+    randomizer = random.Random(seed)
+    glyphNames = _glyphNames(glyphCount)
+    lines = []
+    lookupNames = []
+    for i in range(lookupCount):
+        name = "lookup%05d" % i
+        lookupNames.append(name)
+        lines.append("lookup %s {" % name)
+        if i % 3 == 0:
+            lines.append("    lookupflag IgnoreMarks;")
+        for j in range(rulesPerLookup):
+            glyphName = randomizer.choice(glyphNames)
+            lines.append("    sub %s by %s.ss%02d;" % (glyphName, glyphName, i % 20 + 1))
+        lines.append("} %s;" % name)
+    for i, tag in enumerate(("ss01", "ss02", "salt", "calt")):
+        lines.append("feature %s {" % tag)
+        for name in lookupNames[i::4]:
+            lines.append("    lookup %s;" % name)
+        lines.append("} %s;" % tag)
+    return "\n".join(lines)
+
+# name : (generator, size argument, default size)
+corpora = {
+    "kerning" : (kerningCorpus, "pairCount", 100000),
+    "ligatures" : (ligatureCorpus, "ligatureCount", 5000),
+    "contextual" : (contextualCorpus, "ruleCount", 5000),
+    "lookups" : (lookupCorpus, "lookupCount", 2000),
+}
+
+def makeCorpus(name, scale=1.0):
+    """
+    Make the named corpus with its default size times scale.
+    """
+    generator, sizeArgument, size = corpora[name]
+    return generator(**{sizeArgument : max(1, int(size * scale))})
@@ -0,0 +1,211 @@
+"""
+Timing and memory measurement for the benchmarks.
+
+Each benchmark is a function that takes the corpus text and
+returns a function to measure. The setup work, such as parsing
+the text for a benchmark that only measures a writer, happens
+before the returned function is called.
+
+    results = runBenchmarks(scale=0.1)
+    writeResults(results, "results.json")
+    regressions = compareResults(oldResults, results)
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+import gc
+import io
+import json
+import platform
+import sys
+import time
+from .. import __version__
+from ..parser import parseFeatures
+from ..writers.baseWriter import AbstractFeatureWriter
+from ..writers.fdkSyntaxWriter import FDKSyntaxFeatureWriter
+from ..writers.glyphRenameWriter import GlyphRenameFeatureWriter
+from .corpora import corpora, makeCorpus
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    _timer = time.perf_counter
+except AttributeError:
+    _timer = time.time
+
+
+# ----------
+# Benchmarks
+# ----------
+
+def parseBenchmark(text):
+    # the parser alone
+    def run():
+        parseFeatures(AbstractFeatureWriter(), text)
+    return run
+
+def fdkWriteBenchmark(text):
+    # FDKSyntaxFeatureWriter.write with the writer calls done
+    writer = FDKSyntaxFeatureWriter()
+    parseFeatures(writer, text)
+    def run():
+        writer.write()
+    return run
+
+def glyphRenameBenchmark(text):
+    # parsing into a GlyphRenameFeatureWriter
+    # that renames every glyph, and writing.
+    writer = _GlyphNameCollector()
+    parseFeatures(writer, text)
+    remap = dict((glyphName, glyphName + ".renamed") for glyphName in writer.glyphNames)
+    def run():
+        writer = GlyphRenameFeatureWriter(remap)
+        parseFeatures(writer, text)
+        writer.write()
+    return run
+
+
+class _GlyphNameCollector(AbstractFeatureWriter):
+
+    def __init__(self):
+        self.glyphNames = set()
+
+    def _collect(self, items):
+        if isinstance(items, list):
+            for item in items:
+                self._collect(item)
+        elif items is not None and not items.startswith("@"):
+            self.glyphNames.add(items)
+
+    def classDefinition(self, name, contents):
+        self._collect(contents)
+
+    def gsubType1(self, target, replacement):
+        self._collect([target, replacement])
+
+    def gsubType4(self, target, replacement):
+        self._collect([target, replacement])
+
+    def gsubType6(self, precedingContext, target, trailingContext, replacement):
+        self._collect([precedingContext, target, trailingContext, replacement])
+
+    def gposType2(self, target, value, needEnum=False):
+        self._collect(target)
+
+
+benchmarks = {
+    "parseFeatures" : parseBenchmark,
+    "FDKSyntaxFeatureWriter.write" : fdkWriteBenchmark,
+    "GlyphRenameFeatureWriter" : glyphRenameBenchmark,
+}
+
+# -----------
+# Measurement
+# -----------
+
+def measureTime(function, repeat=3):
+    """
+    Call function repeat times and return the fastest
+    and the mean time in seconds.
+    """
+    times = []
+    for i in range(repeat):
+        gc.collect()
+        start = _timer()
+        function()
+        times.append(_timer() - start)
+    return min(times), sum(times) / len(times)
+
+def measurePeakMemory(function):
+    """
+    Call function and return the peak of the memory that was
+    allocated during the call, in bytes. This is None if
+    tracemalloc is not available.
+    """
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def runBenchmarks(benchmarkNames=None, corpusNames=None, scale=1.0, repeat=3, memory=True):
+    """
+    Run the named benchmarks on the named corpora, all of
+    them by default. scale is applied to the corpus sizes.
+    Returns a dictionary that can be written as JSON.
+    """
+    if benchmarkNames is None:
+        benchmarkNames = sorted(benchmarks)
+    if corpusNames is None:
+        corpusNames = sorted(corpora)
+    results = []
+    for corpusName in corpusNames:
+        text = makeCorpus(corpusName, scale)
+        for benchmarkName in benchmarkNames:
+            function = benchmarks[benchmarkName](text)
+            bestTime, meanTime = measureTime(function, repeat)
+            peakMemory = None
+            if memory:
+                peakMemory = measurePeakMemory(function)
+            results.append(dict(
+                benchmark=benchmarkName,
+                corpus=corpusName,
+                characters=len(text),
+                bestTime=bestTime,
+                meanTime=meanTime,
+                peakMemory=peakMemory
+            ))
+    return dict(
+        feaTools=__version__,
+        python=platform.python_version(),
+        implementation=platform.python_implementation(),
+        platform=sys.platform,
+        scale=scale,
+        repeat=repeat,
+        results=results
+    )
+
+# ----------
+# Comparison
+# ----------
+
+def writeResults(results, path):
+    with io.open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(results, indent=2, sort_keys=True))
+
+def readResults(path):
+    with io.open(path, "r", encoding="utf-8") as f:
+        return json.loads(f.read())
+
+def compareResults(old, new, tolerance=0.1):
+    """
+    Compare two results dictionaries. Returns a list of
+    (benchmark, corpus, measurement, oldValue, newValue)
+    tuples for the measurements that grew by more than
+    tolerance (0.1 is 10%). Times are compared by their
+    best time.
+    """
+    oldResults = {}
+    for result in old["results"]:
+        oldResults[result["benchmark"], result["corpus"]] = result
+    regressions = []
+    for result in new["results"]:
+        key = (result["benchmark"], result["corpus"])
+        oldResult = oldResults.get(key)
+        if oldResult is None:
+            continue
+        for measurement in ("bestTime", "peakMemory"):
+            oldValue = oldResult.get(measurement)
+            newValue = result.get(measurement)
+            if oldValue is None or newValue is None:
+                continue
+            if newValue > oldValue * (1 + tolerance):
+                regressions.append(key + (measurement, oldValue, newValue))
+    return regressions
@@ -0,0 +1,149 @@
+"""
+On disk cache for parsed feature text.
+
+The parser's event stream (see parser.parseFeatureEvents) is
+stored for each text so that unchanged text doesn't have to be
+parsed again in later runs. Entries are keyed by a hash of the
+text and the feaTools version. Once the cache grows past its
+size limit the least recently used entries are removed.
+
+    cache = FeatureParseCache("/tmp/feaCache")
+    writer = FDKSyntaxFeatureWriter()
+    cache.parseFeatures(writer, myFeatureText)
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import zlib
+from . import __version__
+from .parser import parseFeatureEvents, playFeatureEvents, resolveIncludeEvents, internEvents
+
+
+_fileExtension = ".events"
+
+# os.rename can't replace an existing file on Windows
+_replace = getattr(os, "replace", os.rename)
+
+
+class FeatureParseCache(object):
+
+    def __init__(self, directory, maxSize=256 * 1024 * 1024):
+        self.directory = directory
+        self.maxSize = maxSize
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _key(self, text):
+        # marshal data is only readable by
+        # the Python version that wrote it.
+        key = hashlib.sha1()
+        key.update(("feaTools %s marshal %d python %d.%d\n" % ((__version__, marshal.version) + tuple(sys.version_info[:2]))).encode("utf-8"))
+        key.update(text.encode("utf-8"))
+        return key.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _fileExtension)
+
+    def get(self, text):
+        """
+        Get the list of events stored for text.
+        Returns None if there is nothing stored.
+        """
+        path = self._path(self._key(text))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        try:
+            events = marshal.loads(zlib.decompress(data))
+        except (ValueError, EOFError, TypeError, zlib.error):
+            # damaged entries are treated as missing
+            return None
+        # mark the entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return events
+
+    def set(self, text, events):
+        """
+        Store the list of events for text.
+        """
+        path = self._path(self._key(text))
+        data = zlib.compress(marshal.dumps(events), 1)
+        # write to a temporary file first so that
+        # other processes never read a partial entry.
+        descriptor, temporaryPath = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(data)
+            _replace(temporaryPath, path)
+        except (IOError, OSError):
+            if os.path.exists(temporaryPath):
+                os.remove(temporaryPath)
+            raise
+        self.prune()
+
+    def prune(self):
+        """
+        Remove the least recently used entries
+        until the cache fits in maxSize.
+        """
+        entries = []
+        totalSize = 0
+        for fileName in os.listdir(self.directory):
+            if not fileName.endswith(_fileExtension):
+                continue
+            path = os.path.join(self.directory, fileName)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            totalSize += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if totalSize <= self.maxSize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            totalSize -= size
+
+    def clear(self):
+        for fileName in os.listdir(self.directory):
+            if fileName.endswith(_fileExtension):
+                os.remove(os.path.join(self.directory, fileName))
+
+    def parseFeatureEvents(self, text):
+        """
+        Get the events for text from the cache,
+        parsing and storing them if needed.
+        """
+        events = self.get(text)
+        if events is None:
+            events = list(parseFeatureEvents(text))
+            self.set(text, events)
+        return events
+
+    def parseFeatures(self, writer, text, resolveIncludes=False, includeRoots=()):
+        """
+        The same as parser.parseFeatures, but the events are
+        replayed from the cache when text has been seen before.
+        The names in the events are interned in the writer's
+        glyphNameTable, if it has one.
+        """
+        events = self.parseFeatureEvents(text)
+        glyphNameTable = getattr(writer, "glyphNameTable", None)
+        if glyphNameTable is not None:
+            events = internEvents(events, glyphNameTable)
+        if resolveIncludes:
+            events = resolveIncludeEvents(events, includeRoots)
+        playFeatureEvents(writer, events)
@@ -0,0 +1,316 @@
+"""
+Glyph class resolution.
+
+A ClassIndex holds class definitions and flattens classes that
+refer to other classes into the glyphs they contain:
+
+    index = ClassIndex()
+    index.define("@UC", ["A", "B"])
+    index.define("@LC", ["a", "b"])
+    index.define("@ALL", ["@UC", "@LC", "zero"])
+    index.flatten("@ALL")
+
+Each class is flattened once, after the classes it refers to,
+and the result is kept until the class or a class it refers to
+is defined again. Writers that need flattened classes can share
+one index.
+
+A ClassTable is a stack of indexes that follows the feature and
+lookup blocks. A writer with a classTable attribute gets it
+filled in by the parser (see parser.classTableEvents), so the
+classes that can be used in a statement are known when the
+writer call for it is made:
+
+    class MyWriter(AbstractFeatureWriter):
+
+        def __init__(self):
+            self.classTable = ClassTable()
+
+        def gsubType1(self, target, replacement):
+            if self.classTable.isMember("a", target):
+                ...
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+
+def _references(contents):
+    # the class names in contents, with inline classes
+    for item in contents:
+        if isinstance(item, list):
+            for name in _references(item):
+                yield name
+        elif item.startswith("@"):
+            yield item
+
+
+class ClassIndex(object):
+
+    def __init__(self, parent=None):
+        # classes that aren't defined in this index
+        # are looked up in the parent index.
+        self.parent = parent
+        # name : contents
+        self._classes = {}
+        # name : tuple of glyph names
+        self._flattened = {}
+        # name : frozenset of glyph names
+        self._glyphSets = {}
+        # glyph name : set of class names. made when needed.
+        self._reverse = None
+        # name : set of the names of classes that refer to it
+        self._dependents = {}
+
+    def __contains__(self, name):
+        if name in self._classes:
+            return True
+        return self.parent is not None and name in self.parent
+
+    def __len__(self):
+        return len(self._classes)
+
+    def define(self, name, contents):
+        """
+        Define a class. If the class was defined before, the
+        flattened class and the flattened classes that refer
+        to it are dropped.
+        """
+        oldContents = self._classes.get(name)
+        if oldContents is not None:
+            for reference in _references(oldContents):
+                self._dependents.get(reference, set()).discard(name)
+            self._invalidate(name)
+        self._classes[name] = contents
+        self._reverse = None
+        for reference in _references(contents):
+            self._dependents.setdefault(reference, set()).add(name)
+
+    def _invalidate(self, name):
+        stack = [name]
+        while stack:
+            name = stack.pop()
+            self._glyphSets.pop(name, None)
+            if self._flattened.pop(name, None) is not None:
+                stack.extend(self._dependents.get(name, ()))
+
+    def names(self):
+        """
+        Get the names of the classes defined in this index.
+        """
+        return list(self._classes)
+
+    def contents(self, name):
+        """
+        Get the contents of a class as it was defined.
+        """
+        if name not in self._classes and self.parent is not None:
+            return self.parent.contents(name)
+        return self._classes[name]
+
+    def _isFlattened(self, name):
+        # flatten classes from the parent right away
+        if name in self._flattened:
+            return True
+        if name not in self._classes and self.parent is not None and name in self.parent:
+            self.parent.flatten(name)
+            return True
+        return False
+
+    def _getFlattened(self, name):
+        flattened = self._flattened.get(name)
+        if flattened is None:
+            flattened = self.parent.flatten(name)
+        return flattened
+
+    def _flattenContents(self, contents):
+        # the classes in contents must be flattened
+        glyphNames = []
+        for item in contents:
+            if isinstance(item, list):
+                glyphNames.extend(self._flattenContents(item))
+            elif item.startswith("@"):
+                glyphNames.extend(self._getFlattened(item))
+            else:
+                glyphNames.append(item)
+        return glyphNames
+
+    def flatten(self, name):
+        """
+        Get the glyph names in a class, with the classes that
+        it refers to replaced by their glyphs, as a tuple.
+        KeyError is raised for a class that is not defined and
+        ValueError for a class that (indirectly) refers to itself.
+        """
+        flattened = self._flattened.get(name)
+        if flattened is not None:
+            return flattened
+        if name not in self._classes and self.parent is not None:
+            return self.parent.flatten(name)
+        # depth first, with a stack rather than recursion.
+        # each entry is the name and the references that
+        # haven't been flattened yet.
+        path = [name]
+        stack = [(name, _references(self._classes[name]))]
+        while stack:
+            current, references = stack[-1]
+            for reference in references:
+                if self._isFlattened(reference):
+                    continue
+                if reference in path:
+                    cycle = path[path.index(reference):] + [reference]
+                    raise ValueError("Class refers to itself: %s" % " ".join(cycle))
+                if reference not in self._classes:
+                    raise KeyError(reference)
+                path.append(reference)
+                stack.append((reference, _references(self._classes[reference])))
+                break
+            else:
+                self._flattened[current] = tuple(self._flattenContents(self._classes[current]))
+                path.pop()
+                stack.pop()
+        return self._flattened[name]
+
+    def glyphSet(self, name):
+        """
+        Get the flattened glyph names of a class as a frozenset.
+        """
+        glyphSet = self._glyphSets.get(name)
+        if glyphSet is None:
+            if name not in self._classes and self.parent is not None:
+                return self.parent.glyphSet(name)
+            glyphSet = self._glyphSets[name] = frozenset(self.flatten(name))
+        return glyphSet
+
+    def isMember(self, glyphName, name):
+        """
+        Get a bool indicating if glyphName is in the class
+        or in a class that it refers to.
+        """
+        return glyphName in self.glyphSet(name)
+
+    def classesContaining(self, glyphName):
+        """
+        Get the names of the classes defined in this index
+        that contain glyphName, as a set.
+        """
+        if self._reverse is None:
+            reverse = {}
+            for name in self._classes:
+                for member in self.glyphSet(name):
+                    reverse.setdefault(member, set()).add(name)
+            self._reverse = reverse
+        return set(self._reverse.get(glyphName, ()))
+
+    def flattenItems(self, items):
+        """
+        Get the glyph names in a glyph name, a class name or
+        a list of these that may contain inline classes.
+        """
+        if not isinstance(items, list):
+            items = [items]
+        glyphNames = []
+        for item in items:
+            if isinstance(item, list):
+                glyphNames.extend(self.flattenItems(item))
+            elif item.startswith("@"):
+                glyphNames.extend(self.flatten(item))
+            else:
+                glyphNames.append(item)
+        return glyphNames
+
+    def order(self):
+        """
+        Get the class names in an order where every class
+        comes after the classes that it refers to. The errors
+        are the same as for flatten.
+        """
+        # flattening every class finds the loops.
+        # classes from the parent are left out.
+        for name in self._classes:
+            self.flatten(name)
+        ordered = []
+        done = set()
+        for name in self._classes:
+            if name in done:
+                continue
+            done.add(name)
+            stack = [(name, _references(self._classes[name]))]
+            while stack:
+                current, references = stack[-1]
+                for reference in references:
+                    if reference in done or reference not in self._classes:
+                        continue
+                    done.add(reference)
+                    stack.append((reference, _references(self._classes[reference])))
+                    break
+                else:
+                    ordered.append(current)
+                    stack.pop()
+        return ordered
+
+
+class ClassTable(object):
+
+    def __init__(self):
+        # the index for each open scope. the first
+        # one is for the classes outside of blocks.
+        self.scopes = [ClassIndex()]
+
+    @property
+    def scope(self):
+        return self.scopes[-1]
+
+    def openScope(self):
+        """
+        Start a scope for the classes defined in a block.
+        """
+        self.scopes.append(ClassIndex(parent=self.scope))
+
+    def closeScope(self):
+        """
+        Drop the classes defined in the current block.
+        """
+        if len(self.scopes) == 1:
+            raise ValueError("The file scope can't be closed.")
+        self.scopes.pop()
+
+    def __contains__(self, name):
+        return name in self.scope
+
+    def define(self, name, contents):
+        """
+        Define a class in the current scope.
+        """
+        self.scope.define(name, contents)
+
+    def contents(self, name):
+        return self.scope.contents(name)
+
+    def flatten(self, name):
+        return self.scope.flatten(name)
+
+    def flattenItems(self, items):
+        return self.scope.flattenItems(items)
+
+    def glyphSet(self, name):
+        return self.scope.glyphSet(name)
+
+    def isMember(self, glyphName, name):
+        return self.scope.isMember(glyphName, name)
+
+    def classesContaining(self, glyphName):
+        """
+        Get the names of the classes that can be used in the
+        current scope and contain glyphName, as a set.
+        """
+        found = set()
+        # classes in inner scopes hide classes
+        # with the same name in outer scopes.
+        hidden = set()
+        for scope in reversed(self.scopes):
+            for name in scope.classesContaining(glyphName):
+                if name not in hidden:
+                    found.add(name)
+            if scope.parent is not None:
+                hidden.update(scope.names())
+        return found
@@ -0,0 +1,277 @@
+"""
+Object model for parsed feature files.
+
+parseFeaturesToAST returns a FeatureFile. The nodes hold
+the same values that the parser passes to writers, in
+slots named after the writer method arguments, and
+walk(writer) makes those writer calls again:
+
+    tree = parseFeaturesToAST(myFeatureText)
+    for statement in tree.statements:
+        ...
+    writer = FDKSyntaxFeatureWriter()
+    tree.walk(writer)
+
+Inline classes are lists within the glyph sequences,
+just like in the writer calls. Trees are built and walked
+without recursion, so blocks can be nested to any depth,
+but == and repr recurse into nested blocks.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+
+# method name for the event that closes a feature or lookup
+endBlockEvent = "endBlock"
+
+
+class Node(object):
+
+    __slots__ = ()
+    # the writer method that this node stands for
+    methodName = None
+    # values for the last slots, matching the defaults
+    # of the writer method. the parser leaves them out.
+    _defaults = ()
+
+    def __init__(self, *values):
+        missing = len(self.__slots__) - len(values)
+        if missing > 0:
+            if missing > len(self._defaults):
+                raise TypeError("%s needs at least %d values." % (self.__class__.__name__, len(self.__slots__) - len(self._defaults)))
+            values += self._defaults[len(self._defaults) - missing:]
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        values = ", ".join(repr(value) for value in self._values())
+        return "%s(%s)" % (self.__class__.__name__, values)
+
+    def walk(self, writer):
+        getattr(writer, self.methodName)(*self._values())
+
+
+def _walkStatements(writer, statements):
+    # walk statements with a stack rather than
+    # recursion. each entry is a writer and the
+    # statements that are left for it.
+    stack = [(writer, iter(statements))]
+    while stack:
+        writer, statements = stack[-1]
+        for statement in statements:
+            if isinstance(statement, _Block):
+                blockWriter = getattr(writer, statement.methodName)(statement.name)
+                stack.append((blockWriter, iter(statement.statements)))
+                break
+            statement.walk(writer)
+        else:
+            stack.pop()
+
+
+class _Block(Node):
+
+    __slots__ = ("name", "statements")
+
+    def __init__(self, name, statements=None):
+        if statements is None:
+            statements = []
+        self.name = name
+        self.statements = statements
+
+    def walk(self, writer):
+        blockWriter = getattr(writer, self.methodName)(self.name)
+        _walkStatements(blockWriter, self.statements)
+
+
+class FeatureFile(Node):
+
+    __slots__ = ("statements",)
+
+    def __init__(self, statements=None):
+        if statements is None:
+            statements = []
+        self.statements = statements
+
+    def walk(self, writer):
+        _walkStatements(writer, self.statements)
+
+
+class FeatureBlock(_Block):
+
+    __slots__ = ()
+    methodName = "feature"
+
+
+class LookupBlock(_Block):
+
+    __slots__ = ()
+    methodName = "lookup"
+
+
+class TableBlock(Node):
+
+    __slots__ = ("name", "data")
+    methodName = "table"
+
+
+class FeatureReference(Node):
+
+    __slots__ = ("name",)
+    methodName = "featureReference"
+
+
+class LookupReference(Node):
+
+    __slots__ = ("name",)
+    methodName = "lookupReference"
+
+
+class ClassDef(Node):
+
+    __slots__ = ("name", "contents")
+    methodName = "classDefinition"
+
+
+class LookupFlag(Node):
+
+    __slots__ = ("rightToLeft", "ignoreBaseGlyphs", "ignoreLigatures", "ignoreMarks")
+    methodName = "lookupFlag"
+    _defaults = (False, False, False, False)
+
+
+class SingleSub(Node):
+
+    __slots__ = ("target", "replacement")
+    methodName = "gsubType1"
+
+
+class MultipleSub(Node):
+
+    __slots__ = ("target", "replacement")
+    methodName = "gsubType2"
+
+
+class AlternateSub(Node):
+
+    __slots__ = ("target", "replacement")
+    methodName = "gsubType3"
+
+
+class LigatureSub(Node):
+
+    __slots__ = ("target", "replacement")
+    methodName = "gsubType4"
+
+
+class ChainContextSub(Node):
+
+    __slots__ = ("precedingContext", "target", "trailingContext", "replacement")
+    methodName = "gsubType6"
+
+
+class SinglePos(Node):
+
+    __slots__ = ("target", "value")
+    methodName = "gposType1"
+
+
+class PairPos(Node):
+
+    __slots__ = ("target", "value", "needEnum")
+    methodName = "gposType2"
+    _defaults = (False,)
+
+
+class LanguageSystem(Node):
+
+    __slots__ = ("languageTag", "scriptTag")
+    methodName = "languageSystem"
+
+
+class Script(Node):
+
+    __slots__ = ("scriptTag",)
+    methodName = "script"
+
+
+class Language(Node):
+
+    __slots__ = ("languageTag", "includeDefault")
+    methodName = "language"
+    _defaults = (True,)
+
+
+class Include(Node):
+
+    __slots__ = ("path",)
+    methodName = "include"
+
+
+class SubtableBreak(Node):
+
+    __slots__ = ()
+    methodName = "subtableBreak"
+
+
+class RawText(Node):
+
+    __slots__ = ("text",)
+    methodName = "rawText"
+
+
+nodeClasses = dict((nodeClass.methodName, nodeClass) for nodeClass in (
+    FeatureBlock,
+    LookupBlock,
+    TableBlock,
+    FeatureReference,
+    LookupReference,
+    ClassDef,
+    LookupFlag,
+    SingleSub,
+    MultipleSub,
+    AlternateSub,
+    LigatureSub,
+    ChainContextSub,
+    SinglePos,
+    PairPos,
+    LanguageSystem,
+    Script,
+    Language,
+    Include,
+    SubtableBreak,
+    RawText,
+))
+
+
+def buildFeatureTree(events):
+    """
+    Build a FeatureFile from parser events.
+    """
+    tree = FeatureFile()
+    # statement lists of the open blocks
+    stack = [tree.statements]
+    for methodName, arguments, start, end in events:
+        if methodName == endBlockEvent:
+            stack.pop()
+            continue
+        node = nodeClasses[methodName](*arguments)
+        stack[-1].append(node)
+        if isinstance(node, _Block):
+            stack.append(node.statements)
+    return tree
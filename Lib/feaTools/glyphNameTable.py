@@ -0,0 +1,89 @@
+"""
+Symbol table for glyph and class names.
+
+A table keeps one copy of every name that goes through it and
+gives names small int ids on request. Passing a table to the
+lexer makes every name token refer to the table's copy, so a
+name that appears a million times in a file is stored once.
+Writers that want names as ids can ask for them by setting
+useGlyphIds (see AbstractFeatureWriter).
+
+    table = GlyphNameTable()
+    glyphId = table.glyphId("a")
+    table.glyphName(glyphId)
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+from .glyphSet import GlyphSet
+
+
+class GlyphNameTable(object):
+
+    def __init__(self, names=None):
+        # name : name
+        self._strings = {}
+        # name : id
+        self._ids = {}
+        # id : name
+        self._names = []
+        if names is not None:
+            for name in names:
+                self.glyphId(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def intern(self, name):
+        """
+        Get the table's copy of name. This doesn't give name an id.
+        """
+        return self._strings.setdefault(name, name)
+
+    def glyphId(self, name):
+        """
+        Get the id for name, giving it the next id if it doesn't have one.
+        """
+        glyphId = self._ids.get(name)
+        if glyphId is None:
+            name = self.intern(name)
+            glyphId = len(self._names)
+            self._names.append(name)
+            self._ids[name] = glyphId
+        return glyphId
+
+    def getGlyphId(self, name, default=None):
+        """
+        Get the id for name without giving it one.
+        """
+        return self._ids.get(name, default)
+
+    def glyphName(self, glyphId):
+        return self._names[glyphId]
+
+    def glyphIds(self, items):
+        """
+        Convert a glyph sequence, with nested lists for
+        inline classes, to the same structure of ids.
+        GlyphSets are left as they are.
+        """
+        if isinstance(items, list):
+            return [self.glyphIds(item) for item in items]
+        if items is None or isinstance(items, GlyphSet):
+            return items
+        return self.glyphId(items)
+
+    def glyphNames(self, items):
+        """
+        The reverse of glyphIds.
+        """
+        if isinstance(items, list):
+            return [self.glyphNames(item) for item in items]
+        if items is None or isinstance(items, GlyphSet):
+            return items
+        return self._names[items]
@@ -0,0 +1,129 @@
+"""
+Glyph renaming rules.
+
+A GlyphRemap renames glyphs with a dictionary of names and,
+for names that aren't in the dictionary, prefix and regular
+expression rules. The rules are compiled once and every name
+is only worked out once:
+
+    remap = GlyphRemap(
+        {"a.alt" : "a.ss01"},
+        prefixes={"uni" : "u"},
+        patterns=[(r"\\.sc$", ".smcp")]
+    )
+    remap.rename("uni0041")
+    remap.renameItems(["a.alt", ["b.sc", "c"]])
+
+Prefixes are tried longest first and patterns in the order
+they are given. The first rule that matches is used. Class
+names (@name) are only renamed by the dictionary.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+import re
+from .lexer import tokenize, NAME, CLASS, NUMBER
+
+
+def _itemsKey(items):
+    # a glyph sequence with the inline classes as tuples
+    return tuple(_itemsKey(item) if isinstance(item, list) else item for item in items)
+
+
+class GlyphRemap(object):
+
+    def __init__(self, mapping=None, prefixes=None, patterns=None):
+        if mapping is None:
+            mapping = {}
+        self.mapping = mapping
+        self._prefixes = {}
+        self._prefixRE = None
+        if prefixes:
+            self._prefixes = dict(prefixes)
+            alternatives = sorted(self._prefixes, key=len, reverse=True)
+            self._prefixRE = re.compile("|".join(re.escape(prefix) for prefix in alternatives))
+        self._patterns = []
+        if patterns:
+            for pattern, replacement in patterns:
+                if not hasattr(pattern, "subn"):
+                    pattern = re.compile(pattern)
+                self._patterns.append((pattern, replacement))
+        # name : new name
+        self._names = {}
+        # glyph sequence key (see _itemsKey) : renamed list
+        self._lists = {}
+        # text : new text
+        self._texts = {}
+
+    def _renameWithRules(self, name):
+        if name.startswith("@"):
+            return name
+        if self._prefixRE is not None:
+            match = self._prefixRE.match(name)
+            if match is not None:
+                prefix = match.group(0)
+                return self._prefixes[prefix] + name[len(prefix):]
+        for pattern, replacement in self._patterns:
+            newName, count = pattern.subn(replacement, name)
+            if count:
+                return newName
+        return name
+
+    def rename(self, name):
+        """
+        Get the new name for name.
+        """
+        newName = self._names.get(name)
+        if newName is None:
+            newName = self.mapping.get(name)
+            if newName is None:
+                newName = self._renameWithRules(name)
+            self._names[name] = newName
+        return newName
+
+    def renameItems(self, items):
+        """
+        Rename a name or a glyph sequence with nested lists
+        for inline classes. Each distinct sequence and inline
+        class is renamed once. The returned lists are shared
+        between calls and must not be changed.
+        """
+        if items is None:
+            return None
+        if not isinstance(items, list):
+            return self.rename(items)
+        key = _itemsKey(items)
+        renamed = self._lists.get(key)
+        if renamed is None:
+            renamed = []
+            for item in items:
+                if isinstance(item, list):
+                    item = self.renameItems(item)
+                else:
+                    item = self.rename(item)
+                renamed.append(item)
+            self._lists[key] = renamed
+        return renamed
+
+    def renameText(self, text):
+        """
+        Rename the glyph and class names in a piece of FDK
+        syntax that holds only glyphs, classes and symbols,
+        such as the target of gposType1. The rest of the
+        text is kept as it is.
+        """
+        newText = self._texts.get(text)
+        if newText is None:
+            parts = []
+            copied = 0
+            for tokenType, value, start, end in tokenize(text):
+                if tokenType != NAME and tokenType != CLASS and tokenType != NUMBER:
+                    continue
+                newValue = self.rename(value)
+                if newValue == value:
+                    continue
+                parts.append(text[copied:start])
+                parts.append(newValue)
+                copied = end
+            parts.append(text[copied:])
+            newText = self._texts[text] = "".join(parts)
+        return newText
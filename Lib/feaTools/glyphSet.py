@@ -0,0 +1,149 @@
+"""
+Sets of glyphs as bits.
+
+A GlyphSet is a set of glyph names stored as one int, with a bit
+for the id of each glyph in a GlyphNameTable. Union, intersection
+and difference work on the ints, so they are fast for classes
+with thousands of glyphs:
+
+    table = GlyphNameTable()
+    arabic = GlyphSet(table, ["alef", "beh", "teh"])
+    joining = GlyphSet(table, ["beh", "teh", "theh"])
+    arabic & joining
+    "beh" in arabic
+
+Sets can only be combined with sets on the same table. The
+glyphs are kept in id order, not in the order they were given.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+
+class GlyphSet(object):
+
+    __slots__ = ("glyphNameTable", "bits")
+
+    def __init__(self, glyphNameTable, glyphNames=(), bits=0):
+        glyphId = glyphNameTable.glyphId
+        for glyphName in glyphNames:
+            bits |= 1 << glyphId(glyphName)
+        self.glyphNameTable = glyphNameTable
+        self.bits = bits
+
+    @classmethod
+    def fromIds(cls, glyphNameTable, glyphIds):
+        bits = 0
+        for glyphId in glyphIds:
+            bits |= 1 << glyphId
+        return cls(glyphNameTable, bits=bits)
+
+    def _make(self, bits):
+        return self.__class__(self.glyphNameTable, bits=bits)
+
+    def _otherBits(self, other):
+        if not isinstance(other, GlyphSet):
+            other = GlyphSet(self.glyphNameTable, other)
+        elif other.glyphNameTable is not self.glyphNameTable:
+            raise ValueError("The glyph sets have different glyph name tables.")
+        return other.bits
+
+    # ----------
+    # Membership
+    # ----------
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+    def __bool__(self):
+        return self.bits != 0
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, glyphName):
+        if isinstance(glyphName, basestring):
+            glyphId = self.glyphNameTable.getGlyphId(glyphName)
+            if glyphId is None:
+                return False
+        else:
+            glyphId = glyphName
+        return bool(self.bits >> glyphId & 1)
+
+    def glyphIds(self):
+        """
+        Get the glyph ids in the set, in order.
+        """
+        # the binary string is read from the
+        # end, where the lowest bit is.
+        bits = bin(self.bits)[:1:-1]
+        return [glyphId for glyphId, bit in enumerate(bits) if bit == "1"]
+
+    def glyphNames(self):
+        """
+        Get the glyph names in the set, in id order.
+        """
+        glyphName = self.glyphNameTable.glyphName
+        return [glyphName(glyphId) for glyphId in self.glyphIds()]
+
+    def __iter__(self):
+        return iter(self.glyphNames())
+
+    def __repr__(self):
+        return "GlyphSet([%s])" % ", ".join(self.glyphNames())
+
+    # ----------
+    # Comparison
+    # ----------
+
+    def __eq__(self, other):
+        if not isinstance(other, GlyphSet):
+            return NotImplemented
+        return self.glyphNameTable is other.glyphNameTable and self.bits == other.bits
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def issubset(self, other):
+        return self.bits & ~self._otherBits(other) == 0
+
+    def issuperset(self, other):
+        otherBits = self._otherBits(other)
+        return otherBits & ~self.bits == 0
+
+    def isdisjoint(self, other):
+        return self.bits & self._otherBits(other) == 0
+
+    __le__ = issubset
+    __ge__ = issuperset
+
+    # -------
+    # Algebra
+    # -------
+
+    def union(self, other):
+        return self._make(self.bits | self._otherBits(other))
+
+    def intersection(self, other):
+        return self._make(self.bits & self._otherBits(other))
+
+    def difference(self, other):
+        return self._make(self.bits & ~self._otherBits(other))
+
+    def symmetric_difference(self, other):
+        return self._make(self.bits ^ self._otherBits(other))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
@@ -0,0 +1,234 @@
+"""
+Incremental parsing for editors.
+
+IncrementalFeatureParser keeps the events for each top level
+statement and block of a text. When the text is edited only
+the statements and blocks that the edits touch are lexed and
+parsed again, and the changes are returned as a diff:
+
+    parser = IncrementalFeatureParser(myFeatureText)
+    diff = parser.update([(start, end, newText)])
+    for block, removed, added in diff:
+        ...
+    writer = FDKSyntaxFeatureWriter()
+    parser.play(writer)
+
+The events are always the same as the events that
+parseFeatureEvents gives for the whole text.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+from bisect import bisect_left
+from difflib import SequenceMatcher
+from .lexer import tokenize, SYMBOL, UNKNOWN
+from .parser import FeaToolsParserSyntaxError, _matchBraces, _parseUnknown, _splitTopLevel, parseFeatureEvents, playFeatureEvents
+
+
+class _Unit(object):
+
+    # a top level statement or block. the events
+    # have offsets relative to the start of the unit.
+
+    __slots__ = ("key", "events", "error", "braceError", "unknown", "terminated")
+
+    def __init__(self, tokens, start):
+        self.events = []
+        self.error = None
+        self.braceError = False
+        self.unknown = False
+        for token in tokens:
+            if token[0] == UNKNOWN:
+                self.unknown = True
+                break
+        last = tokens[-1]
+        self.terminated = last[0] == SYMBOL and last[1] == ";"
+        try:
+            braces = _matchBraces(tokens)
+        except FeaToolsParserSyntaxError as error:
+            self.error = error
+            self.braceError = True
+            braces = None
+        if braces is not None:
+            try:
+                for methodName, arguments, eventStart, eventEnd in _parseUnknown(tokens, 0, len(tokens), braces):
+                    self.events.append((methodName, arguments, eventStart - start, eventEnd - start))
+            except FeaToolsParserSyntaxError as error:
+                self.events = []
+                self.error = error
+        self.key = None
+        if self.events:
+            methodName, arguments = self.events[0][:2]
+            if methodName in ("feature", "lookup", "table"):
+                self.key = (methodName, arguments[0])
+
+    def content(self):
+        return [event[:2] for event in self.events]
+
+
+def _absoluteEvents(events, offset):
+    return [(methodName, arguments, start + offset, end + offset) for methodName, arguments, start, end in events]
+
+
+class IncrementalFeatureParser(object):
+
+    def __init__(self, text=""):
+        self.text = ""
+        self._units = []
+        # the offset after the end of each unit
+        self._ends = []
+        self.update([(0, 0, text)])
+
+    def events(self):
+        """
+        Yield the events for the whole text. If the text has
+        a syntax error, the first one is raised.
+        """
+        self._raiseError()
+        start = 0
+        for unit, end in zip(self._units, self._ends):
+            for event in _absoluteEvents(unit.events, start):
+                yield event
+            start = end
+
+    def play(self, writer):
+        """
+        Make the writer calls for the whole text.
+        """
+        playFeatureEvents(writer, self.events())
+
+    def update(self, edits):
+        """
+        Apply edits to the text and parse the changed part again.
+        edits is a list of (start, end, text) tuples that replace
+        text[start:end] with text. Each edit is applied to the
+        text as the edits before it left it.
+
+        Returns a list of (block, removed, added) tuples. block
+        is a (keyword, name) tuple for feature, lookup and table
+        blocks and None for top level statements. removed and
+        added are lists of events. Removed events have offsets
+        into the old text and added events have offsets into the
+        new text. Changes within a block that is kept are given
+        as the statements that changed.
+
+        If the new text has a syntax error, the first one
+        is raised after the update.
+        """
+        oldText = text = self.text
+        # the changed region in the new text
+        dirtyStart = dirtyEnd = None
+        for start, end, replacement in edits:
+            text = text[:start] + replacement + text[end:]
+            replacementEnd = start + len(replacement)
+            if dirtyStart is None:
+                dirtyStart = start
+                dirtyEnd = replacementEnd
+            else:
+                if dirtyEnd >= end:
+                    dirtyEnd += replacementEnd - end
+                elif dirtyEnd > start:
+                    dirtyEnd = replacementEnd
+                dirtyStart = min(dirtyStart, start)
+                dirtyEnd = max(dirtyEnd, replacementEnd)
+        self.text = text
+        if dirtyStart is None:
+            return []
+        delta = len(text) - len(oldText)
+        units = self._units
+        ends = self._ends
+        # the first unit to parse again. a unit with an
+        # unknown character may hold the start of a string
+        # or value record that an edit completes, so the
+        # parsing goes back to the first of those.
+        first = bisect_left(ends, dirtyStart)
+        if first == len(units) and units and not units[-1].terminated:
+            first -= 1
+        for index in range(first):
+            if units[index].unknown:
+                first = index
+                break
+        regionStart = 0
+        if first:
+            regionStart = ends[first - 1]
+        # lex and parse until a unit ends where an old
+        # unit ends, after the changed region.
+        newUnits = []
+        newEnds = []
+        last = len(units)
+        unitStart = regionStart
+        for group in _splitTopLevel(tokenize(text, regionStart)):
+            unit = _Unit(group, unitStart)
+            unitEnd = group[-1][3]
+            newUnits.append(unit)
+            newEnds.append(unitEnd)
+            unitStart = unitEnd
+            if unitEnd < dirtyEnd or not unit.terminated:
+                continue
+            index = bisect_left(ends, unitEnd - delta, first)
+            if index < len(units) and ends[index] == unitEnd - delta:
+                last = index + 1
+                break
+        oldUnits = units[first:last]
+        oldStarts = [regionStart] + ends[first:last - 1]
+        newStarts = [regionStart] + newEnds[:-1]
+        units[first:last] = newUnits
+        ends[first:last] = newEnds
+        for index in range(first + len(newUnits), len(ends)):
+            ends[index] += delta
+        diff = self._diff(oldUnits, oldStarts, newUnits, newStarts)
+        self._raiseError()
+        return diff
+
+    def _raiseError(self):
+        for unit in self._units:
+            if unit.braceError:
+                # parseFeatureEvents matches the braces
+                # in the whole text before it parses
+                # anything. let it find the same error.
+                for event in parseFeatureEvents(self.text):
+                    pass
+        for unit in self._units:
+            if unit.error is not None:
+                raise unit.error
+
+    def _diff(self, oldUnits, oldStarts, newUnits, newStarts):
+        diff = []
+        oldKeys = [unit.key for unit in oldUnits]
+        newKeys = [unit.key for unit in newUnits]
+        matcher = SequenceMatcher(None, oldKeys, newKeys, autojunk=False)
+        for tag, oldStart, oldEnd, newStart, newEnd in matcher.get_opcodes():
+            if tag == "equal":
+                for offset in range(oldEnd - oldStart):
+                    oldIndex = oldStart + offset
+                    newIndex = newStart + offset
+                    change = self._diffUnit(oldUnits[oldIndex], oldStarts[oldIndex], newUnits[newIndex], newStarts[newIndex])
+                    if change is not None:
+                        diff.append(change)
+                continue
+            for index in range(oldStart, oldEnd):
+                unit = oldUnits[index]
+                if unit.events:
+                    diff.append((unit.key, _absoluteEvents(unit.events, oldStarts[index]), []))
+            for index in range(newStart, newEnd):
+                unit = newUnits[index]
+                if unit.events:
+                    diff.append((unit.key, [], _absoluteEvents(unit.events, newStarts[index])))
+        return diff
+
+    def _diffUnit(self, oldUnit, oldStart, newUnit, newStart):
+        # the statements between the common
+        # beginning and end of the two units
+        oldContent = oldUnit.content()
+        newContent = newUnit.content()
+        count = min(len(oldContent), len(newContent))
+        head = 0
+        while head < count and oldContent[head] == newContent[head]:
+            head += 1
+        tail = 0
+        while tail < count - head and oldContent[-tail - 1] == newContent[-tail - 1]:
+            tail += 1
+        removed = oldUnit.events[head:len(oldContent) - tail]
+        added = newUnit.events[head:len(newContent) - tail]
+        if not removed and not added:
+            return None
+        return (newUnit.key, _absoluteEvents(removed, oldStart), _absoluteEvents(added, newStart))
@@ -0,0 +1,201 @@
+"""
+Tokenizer for FDK syntax feature files.
+
+The text is walked once and turned into a stream of
+(tokenType, value, start, end) tuples. start and end are
+offsets into the text. Whitespace, comments and strings
+are dropped.
+
+Keywords do not get a token type of their own. Glyph names
+may be spelled like keywords (pos include bar 100;) so the
+parser decides what a name means from where it appears
+in a statement.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+import re
+
+
+# token types
+NAME = "name"
+CLASS = "class"
+NUMBER = "number"
+VALUE = "value"
+INCLUDE = "include"
+SYMBOL = "symbol"
+UNKNOWN = "unknown"
+
+# %(word)s is filled in with the characters
+# that glyph and class names are made of.
+_tokenPattern = (
+    r"(\s+)"                                  # 1 whitespace
+    r"|(#[^\r\n]*)"                           # 2 comment
+    r"|(\"[^\"]*\")"                          # 3 string
+    r"|include\s*\(\s*([^\)]*?)\s*\)"         # 4 include(path)
+    r"|<([^>]*)>"                             # 5 <value record>
+    r"|(@[%(word)s.\-]+)"                     # 6 @class
+    r"|(-?\d+(?:\.\d+)?)(?![%(word)s.\-/])"   # 7 number
+    r"|([%(word)s.\-/]+)"                     # 8 glyph name or keyword
+    r"|([{}\[\];'=,])"                        # 9 symbol
+    r"|(.)"                                   # 10 anything else
+)
+
+tokenRE = re.compile(_tokenPattern % dict(word=r"\w"))
+
+# the same expression for lexing bytes, such as a memory
+# mapped file. every byte of a multi-byte UTF-8 character
+# is taken as a name character, so that the characters
+# are never split. runs with such bytes are decoded and
+# lexed again with tokenRE (see _tokenizeNonASCII), which
+# gives the same tokens as lexing the decoded text.
+bytesTokenRE = re.compile((_tokenPattern % dict(word=r"\w\x80-\xff")).encode("ascii"))
+
+# token types with values that go in a GlyphNameTable
+internedTokenTypes = frozenset([NAME, CLASS, NUMBER])
+
+# token type for each group in tokenRE.
+# whitespace, comments and strings map to None.
+tokenTypes = (None, None, None, None, INCLUDE, VALUE, CLASS, NUMBER, NAME, SYMBOL, UNKNOWN)
+
+
+def tokenize(text, start=0, end=None, glyphNameTable=None):
+    """
+    Yield (tokenType, value, start, end) tuples for text.
+
+    For INCLUDE tokens the value is the path and for
+    VALUE tokens it is the text between < and >.
+    Characters that can't start any token are yielded
+    as UNKNOWN so that the caller can report them.
+
+    text may also be a bytes-like object, such as an mmap.
+    In that case the offsets are byte offsets and only the
+    values of the yielded tokens are decoded. Whitespace,
+    comments and strings are skipped without being decoded.
+
+    If a GlyphNameTable is given the values of NAME, CLASS
+    and NUMBER tokens are the table's copies of the names.
+    """
+    if end is None:
+        end = len(text)
+    intern = None
+    if glyphNameTable is not None:
+        intern = glyphNameTable.intern
+    isText = isinstance(text, type(""))
+    if isText:
+        regex = tokenRE
+    else:
+        regex = bytesTokenRE
+    for match in regex.finditer(text, start, end):
+        group = match.lastindex
+        tokenType = tokenTypes[group]
+        if tokenType is None:
+            continue
+        value = match.group(group)
+        if not isText:
+            try:
+                value = value.decode("ascii")
+            except UnicodeDecodeError:
+                if tokenType == VALUE or tokenType == INCLUDE:
+                    value = value.decode("utf-8")
+                else:
+                    for token in _tokenizeNonASCII(value, match.start(), glyphNameTable):
+                        yield token
+                    continue
+        if intern is not None and tokenType in internedTokenTypes:
+            value = intern(value)
+        yield (tokenType, value, match.start(), match.end())
+
+
+def _tokenizeNonASCII(value, offset, glyphNameTable):
+    # lex a run of bytes with non-ASCII characters as
+    # text. the offsets are turned back into byte offsets.
+    # bytes that aren't UTF-8 raise UnicodeDecodeError, as
+    # they do when the text is decoded before lexing.
+    text = value.decode("utf-8")
+    for tokenType, value, start, end in tokenize(text, glyphNameTable=glyphNameTable):
+        start = offset + len(text[:start].encode("utf-8"))
+        end = offset + len(text[:end].encode("utf-8"))
+        yield (tokenType, value, start, end)
+
+
+# an UNKNOWN token with one of these characters may
+# start a string or a value record that isn't closed
+# yet. the value is the character that closes it.
+_closingCharacters = {"\"": "\"", "<": ">"}
+
+
+def tokenizeChunks(chunks, glyphNameTable=None):
+    """
+    Yield tokens for text that arrives in pieces. chunks
+    is an iterable of strings. Offsets are relative to the
+    start of the first chunk.
+
+    A token is yielded once there is text after it, as the
+    end of the chunk may cut a name, a number, whitespace
+    or a comment. Only the text from the end of the last
+    yielded token is kept and lexed again with the next
+    chunk. A " or < that isn't closed, or include followed
+    by a ( that isn't closed, may be cut the same way. The
+    text from there on is kept, without being lexed again,
+    until a chunk with the closing character arrives or
+    the chunks end.
+    """
+    intern = None
+    if glyphNameTable is not None:
+        intern = glyphNameTable.intern
+    buffer = ""
+    # offset of the buffer in the text
+    offset = 0
+    # the character that the buffer is waiting for
+    # and the chunks that came in while waiting.
+    closing = None
+    pending = []
+    for chunk in chunks:
+        if closing is not None:
+            pending.append(chunk)
+            if closing not in chunk:
+                continue
+            chunk = "".join(pending)
+            closing = None
+            pending = []
+        buffer += chunk
+        size = len(buffer)
+        cut = 0
+        # a name token for include, held until it is
+        # known if an include path follows it.
+        include = None
+        for match in tokenRE.finditer(buffer):
+            start, end = match.span()
+            if end == size:
+                break
+            group = match.lastindex
+            tokenType = tokenTypes[group]
+            value = match.group(group)
+            if include is not None:
+                if group == 1:
+                    continue
+                if tokenType == UNKNOWN and value == "(":
+                    closing = ")"
+                    break
+                yield include
+                cut = include[3] - offset
+                include = None
+            if tokenType == UNKNOWN and value in _closingCharacters:
+                closing = _closingCharacters[value]
+                break
+            if tokenType is None:
+                cut = end
+                continue
+            if intern is not None and tokenType in internedTokenTypes:
+                value = intern(value)
+            token = (tokenType, value, start + offset, end + offset)
+            if tokenType == NAME and value == "include":
+                include = token
+                continue
+            yield token
+            cut = end
+        buffer = buffer[cut:]
+        offset += cut
+    buffer += "".join(pending)
+    for tokenType, value, start, end in tokenize(buffer, glyphNameTable=glyphNameTable):
+        yield (tokenType, value, start + offset, end + offset)
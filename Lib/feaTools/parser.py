@@ -1,7 +1,17 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import codecs
+import marshal
+import mmap as _mmap
+import multiprocessing
+import os
 import re
+from bisect import bisect_left
+from .featureTree import buildFeatureTree, endBlockEvent
+from .glyphRemap import GlyphRemap
+from .glyphSet import GlyphSet
+from .lexer import tokenize, tokenizeChunks, NAME, CLASS, NUMBER, VALUE, INCLUDE, SYMBOL
 
 
 class FeaToolsParserSyntaxError(Exception):
@@ -13,444 +23,257 @@ class FeaToolsParserSyntaxError(Exception):
         return repr(self.value)
 
 
-# used for removing all comments
-commentRE = re.compile(r"#.*")
-
-# used for finding all strings
-stringRE = re.compile(
-    r"\""         # "
-    r"([^\"]*)"   # anything but "
-    r"\""         # "
-)
-
-# used for removing all comments
-terminatorRE = re.compile(r";")
-
-# used for finding all feature names.
-feature_findAll_RE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"feature\s+"           # feature
-        r"([\w\d]{4})"          # name
-        r"\s*{"                 # {
-        )
-
-# used for finding the content of features.
-# this regular expression will be compiled
-# for each feature name found.
-featureContentRE = [
-        r"([\s;\{\}]|^)",       # whitepace, ; {, } or start of line
-        r"feature\s+",          # feature
-        # feature name         # name
-        r"\s*\{",               # {
-        r"([\S\s]*?)",          # content
-        r"}\s*",                # }
-        # feature name         # name
-        r"\s*;"                 # ;
-        ]
-
-# used for finding all lookup names.
-lookup_findAll_RE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"lookup\s+"            # lookup
-        r"([\w\d_.]+)"          # name
-        r"\s*{"                 # {
-        )
-
-# used for finding the content of lookups.
-# this regular expression will be compiled
-# for each lookup name found.
-lookupContentRE = [
-        r"([\s;\{\}]|^)",       # whitepace, ; {, } or start of line
-        r"lookup\s+",           # lookup
-        # lookup name          # name
-        r"\s*\{",               # {
-        r"([\S\s]*?)",          # content
-        r"}\s*",                # }
-        # lookup name          # name
-        r"\s*;"                 # ;
-        ]
-
-# used for finding all table names.
-table_findAll_RE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"table\s+"             # table
-        r"([\w\d/]+)"        # name
-        r"\s*{"                 # {
-        )
-
-# used for finding the content of tables.
-# this regular expression will be compiled
-# for each table name found.
-tableContentRE = [
-        r"([\s;\{\}]|^)",       # whitepace, ; {, } or start of line
-        r"table\s+",            # feature
-        # table name           # name
-        r"\s*\{",               # {
-        r"([\S\s]*?)",          # content
-        r"}\s*",                # }
-        # table name           # name
-        r"\s*;"                 # ;
-        ]
-
-# used for getting tag value pairs from tables.
-tableTagValueRE = re.compile(
-    r"([\w\d_.]+)"       # tag
-    r"\s+"               #
-    r"([^;]+)"           # anything but ;
-    r";"                 # ;
-)
-
-# used for finding all class definitions.
-classDefinitionRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"@"                    # @
-        r"([\w\d_.]+)"          # name
-        r"\s*=\s*"              #  =
-        r"\["                   # [
-        r"([\w\d\s\-_.@]+)"     # content
-        r"\]"                   # ]
-        r"\s*;"                 # ;
-        , re.M
-        )
-
-# used for getting the contents of a class definition
-classContentRE = re.compile(
-        r"([\w\d\-_.@]+)"
-        )
-
-# used for finding inline classes within a sequence
-sequenceInlineClassRE = re.compile(
-        r"\["                   # [
-        r"([\w\d\s_.@]+)"       # content
-        r"\]"                   # ]
-        )
-
-# used for finding all substitution type 1
-subType1And2And4RE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"substitute|sub\s+"    # sub
-        r"([\w\d\s_.@\[\]]+)"   # target
-        r"\s+by\s+"             #  by
-        r"([\w\d\s_.@\[\]]+)"   # replacement
-        r"\s*;"                 # ;
-        )
-
-# used for finding all substitution type 3
-subType3RE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"substitute|sub\s+"    # sub
-        r"([\w\d\s_.@\[\]]+)"   # target
-        r"\s+from\s+"           #  from
-        r"([\w\d\s_.@\[\]]+)"   # replacement
-        r"\s*;"                 # ;
-        )
-
-# used for finding all ignore substitution type 6
-ignoreSubType6RE = re.compile(
-        r"([\s;\{\}]|^)"                          # whitepace, ; {, } or start of line
-        r"ignore\s+substitute|ignore\s+sub\s+"    # ignore sub
-        r"([\w\d\s_.@\[\]']+)"                    # preceding context, target, trailing context
-        r"\s*;"                                   # ;
-        )
-
-# used for finding all substitution type 6
-# XXX see failing unit test
-subType6RE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"substitute|sub\s+"    # sub
-        r"([\w\d\s_.@\[\]']+)"  # preceding context, target, trailing context
-        r"\s+by\s+"             #  by
-        r"([\w\d\s_.@\[\]]+)"   # replacement
-        r"\s*;"                 # ;
-        )
-
-subType6TargetRE = re.compile(
-        r"(\["                  # [
-        r"[\w\d\s_.@]+"         # content
-        r"\]"                   # ]'
-        r"|"                    # <or>
-        r"[\w\d_.@]+)'"         # content
-        )
-
-subType6TargetExtractRE = re.compile(
-        r"([\w\d_.@]*)"       # glyph or class names
-        )
-
-# used for finding positioning type 1
-posType1RE = re.compile(
-    r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-    r"position|pos\s+"      # pos
-    r"([\w\d\s_.@\[\]]+)"   # target
-    r"\s+<"                 # <
-    r"([-\d\s]+)"           # value
-    r"\s*>\s*;"             # >;
-    )
-
-# used for finding positioning type 2
-posType2RE = re.compile(
-    r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-    r"(enum\s+|\s*)"        # enum
-    r"(position|pos\s+)"    # pos
-    r"([-\w\d\s_.@\[\]]+)"  # left, right, value
-    r"\s*;"                 # ;
-    )
-
-# used for finding all languagesystem
-languagesystemRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"languagesystem\s+"    # languagesystem
-        r"([\w\d]+)"            # script tag
-        r"\s+"                  #
-        r"([\w\d]+)"            # language tag
-        r"\s*;"                 # ;
-        )
-
-# use for finding all script
-scriptRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"script\s+"            # script
-        r"([\w\d]+)"            # script tag
-        r"\s*;"                 # ;
-        )
-
-# used for finding all language
-languageRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"language\s+"          # language
-        r"([\w\d]+)"            # language tag
-        r"\s*"                  #
-        r"([\w\d]*)"            # include_dflt or exclude_dflt or nothing
-        r"\s*;"                 # ;
-        )
-
-# use for finding all includes
-includeRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"include\s*"           # include
-        r"\(\s*"                # (
-        r"([^\)]+)"             # anything but )
-        r"\s*\)"                # )
-        r"\s*;{0,1}"            # ; which will occur zero or one times (ugh!)
-        )
-
-# used for finding subtable breaks
-subtableRE = re.compile(
-    r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-    r"subtable\s*"          # subtable
-    r"\s*;"                 # ;
-)
-
-# used for finding feature references
-featureReferenceRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"feature\s+"           # feature
-        r"([\w\d]{4})"          # name
-        r"\s*;"                 # {
-        )
-
-# used for finding lookup references
-lookupReferenceRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"lookup\s+"            # lookup
-        r"([\w\d]+)"            # name
-        r"\s*;"                 # {
-        )
-
-# use for finding all lookup flags
-lookupflagRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"lookupflag\s+"        # lookupflag
-        r"([\w\d,\s]+)"         # values
-        r"\s*;"                 # ;
-        )
-
-# used for finding all stylistic set featureNames.
-featureNamesRE = re.compile(
-        r"([\s;\{\}]|^)"        # whitepace, ; {, } or start of line
-        r"featureNames"         # featureNames
-        r"[\S\s]*?}\s*;"        # everything up until }; with whitespace
-        )
-
-
-def _parseUnknown(writer, text):
-    text = text.strip()
-    ## extract all table names
-    tableNames = table_findAll_RE.findall(text)
-    for precedingMark, tableName in tableNames:
-        # a regular expression specific to this lookup must
-        # be created so that nested lookups are safely handled
-        thisTableContentRE = list(tableContentRE)
-        thisTableContentRE.insert(2, tableName)
-        thisTableContentRE.insert(6, tableName)
-        thisTableContentRE = re.compile("".join(thisTableContentRE))
-        found = thisTableContentRE.search(text)
-        tableText = found.group(2)
-        start, end = found.span()
-        precedingText = text[:start]
-        if precedingMark:
-            precedingText += precedingMark
-        _parseUnknown(writer, precedingText)
-        _parseTable(writer, tableName, tableText)
-        text = text[end:]
-    ## extract all feature names
-    featureTags = feature_findAll_RE.findall(text)
-    for precedingMark, featureTag in featureTags:
-        # a regular expression specific to this lookup must
-        # be created so that nested lookups are safely handled
-        thisFeatureContentRE = list(featureContentRE)
-        thisFeatureContentRE.insert(2, featureTag)
-        thisFeatureContentRE.insert(6, featureTag)
-        thisFeatureContentRE = re.compile("".join(thisFeatureContentRE))
-        found = thisFeatureContentRE.search(text)
-        featureText = found.group(2)
-        start, end = found.span()
-        precedingText = text[:start]
-        if precedingMark:
-            precedingText += precedingMark
-        _parseUnknown(writer, precedingText)
-        _parseFeature(writer, featureTag, featureText)
-        text = text[end:]
-    ## extract all lookup names
-    lookupNames = lookup_findAll_RE.findall(text)
-    for precedingMark, lookupName in lookupNames:
-        # a regular expression specific to this lookup must
-        # be created so that nested lookups are safely handled
-        thisLookupContentRE = list(lookupContentRE)
-        thisLookupContentRE.insert(2, lookupName)
-        thisLookupContentRE.insert(6, lookupName)
-        thisLookupContentRE = re.compile("".join(thisLookupContentRE))
-        found = thisLookupContentRE.search(text)
-        lookupText = found.group(2)
-        start, end = found.span()
-        precedingText = text[:start]
-        if precedingMark:
-            precedingText += precedingMark
-        _parseUnknown(writer, precedingText)
-        _parseLookup(writer, lookupName, lookupText)
-        text = text[end:]
-    ## extract all class data
-    classes = classDefinitionRE.findall(text)
-    for precedingMark, className, classContent in classes:
-        text = _executeSimpleSlice(precedingMark, text, classDefinitionRE, writer)
-        className = "@" + className
-        _parseClass(writer, className, classContent)
-    ## extract substitutions
-    # sub type 1 and 4
-    subType1s = subType1And2And4RE.findall(text)
-    for precedingMark, target, replacement in subType1s:
-        text = _executeSimpleSlice(precedingMark, text, subType1And2And4RE, writer)
-        _parseSubType1And2And4(writer, target, replacement)
-    # sub type 3
-    subType3s = subType3RE.findall(text)
-    for precedingMark, target, replacement in subType3s:
-        text = _executeSimpleSlice(precedingMark, text, subType3RE, writer)
-        _parseSubType3(writer, target, replacement)
-    # sub type 6
-    subType6s = subType6RE.findall(text)
-    for precedingMark, target, replacement in subType6s:
-        text = _executeSimpleSlice(precedingMark, text, subType6RE, writer)
-        _parseSubType6(writer, target, replacement)
-    # ignore sub type 6
-    ignoreSubType6s = ignoreSubType6RE.findall(text)
-    for precedingMark, target in ignoreSubType6s:
-        text = _executeSimpleSlice(precedingMark, text, ignoreSubType6RE, writer)
-        _parseSubType6(writer, target, replacement=None, ignore=True)
-    ## extract positions
-    # pos type 1
-    posType1s = posType1RE.findall(text)
-    for precedingMark, target, value in posType1s:
-        text = _executeSimpleSlice(precedingMark, text, posType1RE, writer)
-        _parsePosType1(writer, target, value)
-    # pos type 2
-    posType2s = posType2RE.findall(text)
-    for precedingMark, enumTag, posTag, targetAndValue in posType2s:
-        text = _executeSimpleSlice(precedingMark, text, posType2RE, writer)
-        _parsePosType2(writer, targetAndValue, needEnum=enumTag.strip())
-    ## extract other data
+# token types that can stand for a glyph or a glyph class
+glyphTokenTypes = frozenset([NAME, CLASS, NUMBER])
+
+# keywords that open a named block
+blockKeywords = frozenset(["feature", "lookup", "table"])
+
+# tables that contain tag value pairs.
+# all other tables are skipped.
+tagValueTables = frozenset(["GDEF", "head", "hhea", "OS/2", "vhea"])
+
+# symbols that are written without a space before them
+_attachedSymbols = frozenset(["]", "'", ",", ";"])
+
+
+def _tokensToText(tokens, start, end):
+    # rebuild readable text from a run of
+    # tokens for error messages and table values.
+    parts = []
+    previous = None
+    for index in range(start, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType == VALUE:
+            value = "<%s>" % value
+        elif tokenType == INCLUDE:
+            value = "include(%s)" % value
+        if parts and previous != "[":
+            if value not in _attachedSymbols or previous == ",":
+                parts.append(" ")
+        parts.append(value)
+        previous = value
+    return "".join(parts)
+
+def _syntaxError(tokens, start, end):
+    return FeaToolsParserSyntaxError("Invalid Syntax: %s" % _tokensToText(tokens, start, end))
+
+def _isSymbol(tokens, index, symbol):
+    if index >= len(tokens):
+        return False
+    tokenType, value = tokens[index][:2]
+    return tokenType == SYMBOL and value == symbol
+
+def _isName(tokens, index, names):
+    if index >= len(tokens):
+        return False
+    tokenType, value = tokens[index][:2]
+    return tokenType == NAME and value in names
+
+def _findTerminator(tokens, start, end):
+    # find the ; that ends the statement
+    # starting at start. blocks can't be
+    # opened or closed within a statement.
+    for index in range(start, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType != SYMBOL:
+            continue
+        if value == ";":
+            return index
+        if value == "{" or value == "}":
+            raise _syntaxError(tokens, start, index + 1)
+    raise _syntaxError(tokens, start, end)
+
+def _matchBraces(tokens):
+    # map the index of every { to the index of
+    # its }. this is done once for the whole
+    # token list so that blocks can be handed
+    # around as index ranges.
+    braces = {}
+    stack = []
+    for index, token in enumerate(tokens):
+        if token[0] != SYMBOL:
+            continue
+        value = token[1]
+        if value == "{":
+            stack.append(index)
+        elif value == "}":
+            if not stack:
+                raise _syntaxError(tokens, index, index + 1)
+            braces[stack.pop()] = index
+    if stack:
+        raise _syntaxError(tokens, stack[-1], len(tokens))
+    return braces
+
+def _isBlockStart(tokens, index, end):
+    keyword = tokens[index][1]
+    if keyword in blockKeywords:
+        return index + 2 < end and _isSymbol(tokens, index + 2, "{") and tokens[index + 1][0] == NAME
+    if keyword == "featureNames":
+        return index + 1 < end and _isSymbol(tokens, index + 1, "{")
+    return False
+
+def _parseUnknown(tokens, start, end, braces):
+    # yield (methodName, arguments, start, end) for
+    # everything between start and end in source order.
+    # nested blocks are handled with a stack rather than
+    # recursion, so any depth of nesting can be parsed.
+    # (end of the enclosing content, index after the
+    # block, endBlock event) for each open block
+    openBlocks = []
+    index = start
+    while True:
+        if index >= end:
+            if not openBlocks:
+                break
+            end, index, event = openBlocks.pop()
+            yield event
+            continue
+        token = tokens[index]
+        tokenType, value = token[:2]
+        # empty instructions
+        if tokenType == SYMBOL and value == ";":
+            yield ("rawText", (value,), token[2], token[3])
+            index += 1
+        # include. the ; is optional. (ugh!)
+        elif tokenType == INCLUDE:
+            eventEnd = token[3]
+            index += 1
+            if index < end and _isSymbol(tokens, index, ";"):
+                eventEnd = tokens[index][3]
+                index += 1
+            yield ("include", (value,), token[2], eventEnd)
+        elif tokenType == NAME and _isBlockStart(tokens, index, end):
+            blockEnd = _findBlockEnd(tokens, index, end, braces)
+            # featureNames are skipped
+            if value == "featureNames":
+                index = blockEnd
+                continue
+            name = tokens[index + 1][1]
+            contentStart = index + 3
+            contentEnd = braces[index + 2]
+            eventStart = token[2]
+            eventEnd = tokens[blockEnd - 1][3]
+            if value == "table":
+                event = _parseTable(name, tokens, contentStart, contentEnd)
+                if event is not None:
+                    methodName, arguments = event
+                    yield (methodName, arguments, eventStart, eventEnd)
+                index = blockEnd
+                continue
+            # feature and lookup blocks are opened with
+            # an event for the whole block and closed
+            # with an endBlock event for the } name;
+            yield (value, (name,), eventStart, eventEnd)
+            openBlocks.append((end, blockEnd, (endBlockEvent, (), tokens[contentEnd][2], eventEnd)))
+            index = contentStart
+            end = contentEnd
+        else:
+            terminator = _findTerminator(tokens, index, end)
+            event = _parseStatement(tokens, index, terminator)
+            # some statements, such as a language with an
+            # unknown keyword, have nothing to report.
+            if event is not None:
+                methodName, arguments = event
+                yield (methodName, arguments, token[2], tokens[terminator][3])
+            index = terminator + 1
+
+def _findBlockEnd(tokens, start, end, braces):
+    # keyword name { content } name;
+    # returns the index after the ;
+    name = None
+    openIndex = start + 1
+    if tokens[start][1] != "featureNames":
+        name = tokens[start + 1][1]
+        openIndex = start + 2
+    index = braces[openIndex] + 1
+    # the block must be closed with its own name
+    if name is not None:
+        if index >= end or tokens[index][:2] != (NAME, name):
+            raise _syntaxError(tokens, start, min(index + 1, end))
+        index += 1
+    if index >= end or not _isSymbol(tokens, index, ";"):
+        raise _syntaxError(tokens, start, min(index + 1, end))
+    return index + 1
+
+def _parseStatement(tokens, start, end):
+    tokenType, value = tokens[start][:2]
+    if tokenType == CLASS and _isSymbol(tokens, start + 1, "="):
+        return _parseClass(value, tokens, start + 2, end)
+    if tokenType == NAME:
+        # ignore sub and enum pos are two word keywords
+        if value == "ignore" and _isName(tokens, start + 1, ("sub", "substitute")):
+            return _parseSubstitution(tokens, start + 2, end, ignore=True)
+        if value in ("enum", "enumerate") and _isName(tokens, start + 1, ("pos", "position")):
+            return _parsePosition(tokens, start + 2, end, needEnum=True)
+        parser = _statementParsers.get(value)
+        if parser is not None:
+            return parser(tokens, start + 1, end)
+    raise _syntaxError(tokens, start, end + 1)
+
+def _parseNames(tokens, start, end, minimum, maximum):
+    # get the values of a fixed number of names
+    names = []
+    for index in range(start, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType not in glyphTokenTypes:
+            raise _syntaxError(tokens, start - 1, end + 1)
+        names.append(value)
+    if not minimum <= len(names) <= maximum:
+        raise _syntaxError(tokens, start - 1, end + 1)
+    return names
+
+def _parseLanguageSystem(tokens, start, end):
+    scriptTag, languageTag = _parseNames(tokens, start, end, 2, 2)
     # XXX look at FDK spec. sometimes a language tag of dflt will be passed
     # it should be handled differently than the other tags.
-    # languagesystem
-    languagesystems = languagesystemRE.findall(text)
-    for precedingMark, scriptTag, languageTag in languagesystems:
-        text = _executeSimpleSlice(precedingMark, text, languagesystemRE, writer)
-        writer.languageSystem(languageTag, scriptTag)
-    # script
-    scripts = scriptRE.findall(text)
-    for precedingMark, scriptTag in scripts:
-        text = _executeSimpleSlice(precedingMark, text, scriptRE, writer)
-        writer.script(scriptTag)
-    # language
-    languages = languageRE.findall(text)
-    for precedingMark, languageTag, otherKeyword in languages:
-        text = _executeSimpleSlice(precedingMark, text, languageRE, writer)
-        if not otherKeyword or otherKeyword == "include_dflt":
-            writer.language(languageTag)
-        elif otherKeyword == "exclude_dflt":
-            writer.language(languageTag, includeDefault=False)
-    # include
-    inclusions = includeRE.findall(text)
-    for precedingMark, path in inclusions:
-        text = _executeSimpleSlice(precedingMark, text, includeRE, writer)
-        writer.include(path)
-    # feature reference
-    featureReferences = featureReferenceRE.findall(text)
-    for precedingMark, featureTag in featureReferences:
-        text = _executeSimpleSlice(precedingMark, text, featureReferenceRE, writer)
-        writer.featureReference(featureTag)
-    # lookup reference
-    lookupReferences = lookupReferenceRE.findall(text)
-    for precedingMark, lookupName in lookupReferences:
-        text = _executeSimpleSlice(precedingMark, text, lookupReferenceRE, writer)
-        writer.lookupReference(lookupName)
-    # lookupflag
-    lookupflags = lookupflagRE.findall(text)
-    for precedingMark, lookupflagValues in lookupflags:
-        text = _executeSimpleSlice(precedingMark, text, lookupflagRE, writer)
-        _parseLookupFlag(writer, lookupflagValues)
-    # subtable break
-    subtables = subtableRE.findall(text)
-    for precedingMark in subtables:
-        text = _executeSimpleSlice(precedingMark, text, subtableRE, writer)
-        writer.subtableBreak()
-    ## extract all featureNames
-    featureNames = featureNamesRE.findall(text)
-    for precedingMark in featureNames:
-        text = _executeSimpleSlice(precedingMark, text, featureNamesRE, writer)
-    # empty instructions
-    terminators = terminatorRE.findall(text)
-    for terminator in terminators:
-        text = _executeSimpleSlice(None, text, terminatorRE, writer)
-        writer.rawText(terminator)
-    text = text.strip()
-    if text:
-        raise FeaToolsParserSyntaxError("Invalid Syntax: %s" % text)
-
-def _executeSimpleSlice(precedingMark, text, regex, writer):
-    first = regex.search(text)
-    start, end = first.span()
-    precedingText = text[:start]
-    if precedingMark:
-        precedingText += precedingMark
-    _parseUnknown(writer, precedingText)
-    text = text[end:]
-    return text
-
-def _parseFeature(writer, name, feature):
-    featureWriter = writer.feature(name)
-    parsed = _parseUnknown(featureWriter, feature)
-
-def _parseLookup(writer, name, lookup):
-    lookupWriter = writer.lookup(name)
-    parsed = _parseUnknown(lookupWriter, lookup)
-
-def _parseTable(writer, name, table):
-    tagValueTables = ["GDEF", "head", "hhea", "OS/2", "vhea"]
+    return ("languageSystem", (languageTag, scriptTag))
+
+def _parseScript(tokens, start, end):
+    scriptTag, = _parseNames(tokens, start, end, 1, 1)
+    return ("script", (scriptTag,))
+
+def _parseLanguage(tokens, start, end):
+    names = _parseNames(tokens, start, end, 1, 2)
+    languageTag = names[0]
+    otherKeyword = None
+    if len(names) == 2:
+        otherKeyword = names[1]
+    if not otherKeyword or otherKeyword == "include_dflt":
+        return ("language", (languageTag,))
+    elif otherKeyword == "exclude_dflt":
+        return ("language", (languageTag, False))
+
+def _parseFeatureReference(tokens, start, end):
+    featureTag, = _parseNames(tokens, start, end, 1, 1)
+    return ("featureReference", (featureTag,))
+
+def _parseLookupReference(tokens, start, end):
+    lookupName, = _parseNames(tokens, start, end, 1, 1)
+    return ("lookupReference", (lookupName,))
+
+def _parseSubtable(tokens, start, end):
+    _parseNames(tokens, start, end, 0, 0)
+    return ("subtableBreak", ())
+
+def _parseLookupFlagStatement(tokens, start, end):
+    values = []
+    for index in range(start, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType == SYMBOL and value == ",":
+            continue
+        if tokenType != NAME and tokenType != NUMBER:
+            raise _syntaxError(tokens, start - 1, end + 1)
+        values.append(value)
+    return _parseLookupFlag(values)
+
+def _parseTable(name, tokens, start, end):
     # skip unknown tables
     if name not in tagValueTables:
-        return
-    _parseTagValueTable(writer, name, table)
+        return None
+    return _parseTagValueTable(name, tokens, start, end)
 
-def _parseTagValueTable(writer, name, table):
+def _parseTagValueTable(name, tokens, start, end):
     valueTypes = {
         "GDEF" : {
             "GlyphClassDef" : str
@@ -488,20 +311,23 @@ def _parseTagValueTable(writer, name, table):
     }
     tableTypes = valueTypes[name]
     parsedTagValues = []
-    for tag, value in tableTagValueRE.findall(table):
-        tag = tag.strip()
-        value = value.strip()
+    index = start
+    while index < end:
+        terminator = _findTerminator(tokens, index, end)
+        tagType, tag = tokens[index][:2]
+        valueStart = index + 1
+        index = terminator + 1
+        # a tag without a value (the value may
+        # have been a string) is skipped.
+        if tagType != NAME or valueStart == terminator:
+            continue
+        value = _tokensToText(tokens, valueStart, terminator)
         if tag not in tableTypes:
             raise FeaToolsParserSyntaxError("Unknown Tag: %s" % tag)
         desiredType = tableTypes[tag]
         if desiredType == "listOfInts":
-            v = []
-            for line in value.splitlines():
-                for i in line.split():
-                    v.append(i)
-            value = v
             values = []
-            for i in value:
+            for i in value.split():
                 try:
                     i = int(i)
                     values.append(i)
@@ -512,30 +338,93 @@ def _parseTagValueTable(writer, name, table):
             try:
                 value = desiredType(value)
             except ValueError:
-                raise FeaToolsParserSyntaxError("Invalid Syntax: %s" % i)
+                raise FeaToolsParserSyntaxError("Invalid Syntax: %s" % value)
         parsedTagValues.append((tag, value))
-    writer.table(name, parsedTagValues)
+    return ("table", (name, parsedTagValues))
+
+def _parseClass(name, tokens, start, end):
+    # @name = [content];
+    if not _isSymbol(tokens, start, "[") or not _isSymbol(tokens, end - 1, "]"):
+        raise _syntaxError(tokens, start - 2, end + 1)
+    content = _parseNames(tokens, start + 1, end - 1, 0, end)
+    return ("classDefinition", (name, content))
 
-def _parseClass(writer, name, content):
-    content = classContentRE.findall(content)
-    writer.classDefinition(name, content)
+def _parseInlineClass(tokens, start, end):
+    # start is the index of the [.
+    # returns the index of the ] and the contents.
+    content = []
+    for index in range(start + 1, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType in glyphTokenTypes:
+            content.append(value)
+        elif tokenType == SYMBOL and value == "]":
+            return index, content
+        else:
+            break
+    raise _syntaxError(tokens, start, end)
 
-def _parseSequence(sequence):
+def _parseSequence(tokens, start, end, allowMarks=False):
+    # glyphs and classes are strings.
+    # inline classes are lists.
+    # if allowMarks is True, the sequence
+    # is made of (item, marked) tuples.
     parsed = []
-    for content in sequenceInlineClassRE.findall(sequence):
-        first = sequenceInlineClassRE.search(sequence)
-        start, end = first.span()
-        precedingText = sequence[:start]
-        parsed.extend(_parseSequence(precedingText))
-        parsed.append(_parseSequence(content))
-        sequence = sequence[end:]
-    content = [i for i in sequence.split(" ") if i]
-    parsed.extend(content)
+    index = start
+    while index < end:
+        tokenType, value = tokens[index][:2]
+        if tokenType in glyphTokenTypes:
+            item = value
+        elif tokenType == SYMBOL and value == "[":
+            index, item = _parseInlineClass(tokens, index, end)
+        else:
+            raise _syntaxError(tokens, start, end)
+        index += 1
+        if allowMarks:
+            marked = _isSymbol(tokens, index, "'") and index < end
+            if marked:
+                index += 1
+            item = (item, marked)
+        parsed.append(item)
     return parsed
 
-def _parseSubType1And2And4(writer, target, replacement):
-    target = _parseSequence(target)
-    replacement = _parseSequence(replacement)
+def _flattenSequence(sequence):
+    flat = []
+    for item in sequence:
+        if isinstance(item, list):
+            flat.extend(item)
+        else:
+            flat.append(item)
+    return flat
+
+def _parseSubstitution(tokens, start, end, ignore=False):
+    separator = None
+    separatorIndex = end
+    contextual = False
+    for index in range(start, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType == SYMBOL and value == "'":
+            contextual = True
+        elif tokenType == NAME and separator is None and value in ("by", "from"):
+            separator = value
+            separatorIndex = index
+    if ignore:
+        if separator is not None:
+            raise _syntaxError(tokens, start - 2, end + 1)
+        return _parseSubType6(tokens, start, end)
+    if separator is None or separatorIndex == start or separatorIndex == end - 1:
+        raise _syntaxError(tokens, start - 1, end + 1)
+    if contextual:
+        if separator != "by":
+            raise _syntaxError(tokens, start - 1, end + 1)
+        return _parseSubType6(tokens, start, separatorIndex, (separatorIndex + 1, end))
+    elif separator == "from":
+        return _parseSubType3(tokens, start, separatorIndex, separatorIndex + 1, end)
+    else:
+        return _parseSubType1And2And4(tokens, start, separatorIndex, separatorIndex + 1, end)
+
+def _parseSubType1And2And4(tokens, targetStart, targetEnd, replacementStart, replacementEnd):
+    target = _parseSequence(tokens, targetStart, targetEnd)
+    replacement = _parseSequence(tokens, replacementStart, replacementEnd)
     if len(target) > 1 and len(replacement) > 1:
         raise FeaToolsParserSyntaxError("many to many replacement are not allowed")
     if len(target) == 1 and len(replacement) == 1:
@@ -544,26 +433,26 @@ def _parseSubType1And2And4(writer, target, replacement):
         # reresenting an inline class.
         target = target[0]
         replacement = replacement[0]
-        writer.gsubType1(target, replacement)
+        return ("gsubType1", (target, replacement))
     elif len(replacement) == 1:
         # target will always be a list representing a sequence.
         # the list may contain strings representing a single
         # glyph/class or a list representing an inline class.
         replacement = replacement[0]
-        writer.gsubType4(target, replacement)
+        return ("gsubType4", (target, replacement))
     else:
         target = target[0]
-        writer.gsubType2(target, replacement)
+        return ("gsubType2", (target, replacement))
 
-def _parseSubType3(writer, target, replacement):
+def _parseSubType3(tokens, targetStart, targetEnd, replacementStart, replacementEnd):
     # target will only be one item representing
     # a glyph/class name.
-    target = classContentRE.findall(target)
+    target = _flattenSequence(_parseSequence(tokens, targetStart, targetEnd))
     target = target[0]
-    replacement = classContentRE.findall(replacement)
-    writer.gsubType3(target, replacement)
+    replacement = _flattenSequence(_parseSequence(tokens, replacementStart, replacementEnd))
+    return ("gsubType3", (target, replacement))
 
-def _parseSubType6(writer, target, replacement=None, ignore=False):
+def _parseSubType6(tokens, start, end, replacement=None):
     # replacement will always be one item.
     # either a single glyph/class or a list
     # representing an inline class.
@@ -571,56 +460,57 @@ def _parseSubType6(writer, target, replacement=None, ignore=False):
     # this is an ignore substitution.
     # in that case, replacement will
     # be None.
-    if not ignore:
-        replacement = classContentRE.findall(replacement)
+    if replacement is not None:
+        replacementStart, replacementEnd = replacement
+        replacement = _flattenSequence(_parseSequence(tokens, replacementStart, replacementEnd))
         if len(replacement) == 1:
             replacement = replacement[0]
-    #
-    targetText = target
-    #
-    precedingContext = ""
-    targets = subType6TargetRE.findall(targetText)
-    trailingContext = ""
-    #
-    targetCount = len(targets)
-    counter = 1
-    extractedTargets = []
-    for target in targets:
-        first = subType6TargetRE.search(targetText)
-        start, end = first.span()
-        if counter == 1:
-            precedingContext = _parseSequence(targetText[:start])
-        if counter == targetCount:
-            trailingContext = _parseSequence(targetText[end:])
+    sequence = _parseSequence(tokens, start, end, allowMarks=True)
+    markedIndexes = [index for index, (item, marked) in enumerate(sequence) if marked]
+    if not markedIndexes:
+        precedingContext = []
+        extractedTargets = []
+        trailingContext = []
+    else:
+        first = markedIndexes[0]
+        last = markedIndexes[-1]
+        precedingContext = [item for item, marked in sequence[:first]]
+        trailingContext = [item for item, marked in sequence[last + 1:]]
         # the target could be in a form like [o o.alt]
-        # so it has to be broken down
-        target = classContentRE.findall(target)
-        if len(target) == 1:
-            target = target[0]
-        extractedTargets.append(target)
-        counter += 1
-        targetText = targetText[end:]
-    writer.gsubType6(precedingContext, extractedTargets, trailingContext, replacement)
-
-def _parsePosType1(writer, target, value):
+        # a single glyph inline class is reduced to the glyph.
+        extractedTargets = []
+        for index in markedIndexes:
+            target = sequence[index][0]
+            if isinstance(target, list) and len(target) == 1:
+                target = target[0]
+            extractedTargets.append(target)
+    return ("gsubType6", (precedingContext, extractedTargets, trailingContext, replacement))
+
+def _parsePosition(tokens, start, end, needEnum=False):
+    tokenType, value = tokens[end - 1][:2]
+    if tokenType == VALUE and not needEnum:
+        return _parsePosType1(tokens, start, end - 1, value)
+    elif tokenType == NUMBER:
+        return _parsePosType2(tokens, start, end - 1, value, needEnum)
+    else:
+        raise _syntaxError(tokens, start - 1, end + 1)
+
+def _parsePosType1(tokens, start, end, value):
     # target will only be one item representing
     # a glyph/class name
-    value = tuple([float(i) for i in value.strip().split(" ")])
-    writer.gposType1(target, value)
-
-def _parsePosType2(writer, targetAndValue, needEnum=False):
-    # the target and value will be coming
-    # in as single string.
-    target = " ".join(targetAndValue.split(" ")[:-1])
-    value = targetAndValue.split(" ")[-1]
-    # XXX this could cause a choke
+    target = _tokensToText(tokens, start, end)
+    try:
+        value = tuple([float(i) for i in value.split()])
+    except ValueError:
+        raise _syntaxError(tokens, start - 1, end + 2)
+    return ("gposType1", (target, value))
+
+def _parsePosType2(tokens, start, end, value, needEnum=False):
+    target = _parseSequence(tokens, start, end)
     value = float(value)
-    target = _parseSequence(target)
-    writer.gposType2(target, value, needEnum)
+    return ("gposType2", (target, value, needEnum))
 
-def _parseLookupFlag(writer, values):
-    values = values.replace(",", " ")
-    values = [i for i in values.split(" ") if i]
+def _parseLookupFlag(values):
     # lookupflag format B is not supported except for value 0
     if len(values) == 1:
         try:
@@ -628,8 +518,7 @@ def _parseLookupFlag(writer, values):
             if v != 0:
                 raise FeaToolsParserSyntaxError("lookupflag format B is not supported for any value other than 0")
             else:
-                writer.lookupFlag()
-                return
+                return ("lookupFlag", ())
         except ValueError:
             pass
     rightToLeft = False
@@ -648,18 +537,697 @@ def _parseLookupFlag(writer, values):
             ignoreLigatures = True
         elif value == "IgnoreMarks":
             ignoreMarks = True
-    writer.lookupFlag(rightToLeft=rightToLeft, ignoreBaseGlyphs=ignoreBaseGlyphs, ignoreLigatures=ignoreLigatures, ignoreMarks=ignoreMarks)
-
-def parseFeatures(writer, text):
-    # strip the strings.
-    # (an alternative approach would be to escape the strings.
-    # the problem is that a string could contain parsable text
-    # that would fool the parsing algorithm.)
-    text = stringRE.sub(r"", text)
-    # strip the comments
-    text = commentRE.sub(r"", text)
-    # make sure there is a space after all ;
-    # since it makes the text more digestable
-    # for the regular expressions
-    text = terminatorRE.sub(r"; ", text)
-    _parseUnknown(writer, text)
+    return ("lookupFlag", (rightToLeft, ignoreBaseGlyphs, ignoreLigatures, ignoreMarks))
+
+# statements that start with a single keyword
+_statementParsers = {
+    "sub"            : _parseSubstitution,
+    "substitute"     : _parseSubstitution,
+    "pos"            : _parsePosition,
+    "position"       : _parsePosition,
+    "languagesystem" : _parseLanguageSystem,
+    "script"         : _parseScript,
+    "language"       : _parseLanguage,
+    "feature"        : _parseFeatureReference,
+    "lookup"         : _parseLookupReference,
+    "lookupflag"     : _parseLookupFlagStatement,
+    "subtable"       : _parseSubtable,
+}
+
+def parseFeatureEvents(text, glyphNameTable=None):
+    """
+    Parse text and yield one event per writer call, in the
+    order the statements appear in the text. An event is a
+    (methodName, arguments, start, end) tuple. methodName is
+    the name of an AbstractFeatureWriter method, arguments are
+    the positional arguments for it and start and end are the
+    offsets of the statement in text. feature and lookup events
+    span the whole block and are followed by the events for the
+    block's contents and an endBlock event for the closing
+    } name;
+
+    If a GlyphNameTable is given the names in the events
+    are the table's copies.
+    """
+    # the text is tokenized in one pass.
+    # comments and strings are dropped
+    # by the tokenizer.
+    tokens = list(tokenize(text, glyphNameTable=glyphNameTable))
+    braces = _matchBraces(tokens)
+    return _parseUnknown(tokens, 0, len(tokens), braces)
+
+# the arguments of each method that hold glyph or class names
+_glyphArguments = {
+    "classDefinition" : (0, 1),
+    "gsubType1"       : (0, 1),
+    "gsubType2"       : (0, 1),
+    "gsubType3"       : (0, 1),
+    "gsubType4"       : (0, 1),
+    "gsubType6"       : (0, 1, 2, 3),
+    "gposType2"       : (0,),
+}
+
+def glyphIdEvents(events, glyphNameTable):
+    """
+    Replace the glyph and class names in events with their
+    ids in glyphNameTable. Inline classes become lists of ids.
+    The target of gposType1 is source text and is left alone.
+    """
+    glyphIds = glyphNameTable.glyphIds
+    for event in events:
+        positions = _glyphArguments.get(event[0])
+        if positions is not None:
+            methodName, arguments, start, end = event
+            arguments = list(arguments)
+            for position in positions:
+                arguments[position] = glyphIds(arguments[position])
+            event = (methodName, tuple(arguments), start, end)
+        yield event
+
+def _internItems(items, intern):
+    if isinstance(items, list):
+        return [_internItems(item, intern) for item in items]
+    if items is None:
+        return items
+    return intern(items)
+
+# the arguments of each method that hold other names
+# or text made from names. the tags in table data are
+# handled in internEvents.
+_nameArguments = {
+    "feature"          : (0,),
+    "lookup"           : (0,),
+    "gposType1"        : (0,),
+    "featureReference" : (0,),
+    "lookupReference"  : (0,),
+    "languageSystem"   : (0, 1),
+    "script"           : (0,),
+    "language"         : (0,),
+}
+
+def internEvents(events, glyphNameTable):
+    """
+    Replace the names in events with glyphNameTable's
+    copies, as parseFeatureEvents does when it is given
+    the table. This is for events that were parsed without
+    the table, such as events from another process.
+    """
+    intern = glyphNameTable.intern
+    for event in events:
+        if event[0] == "table":
+            methodName, (name, data), start, end = event
+            data = [(intern(tag), value) for tag, value in data]
+            yield (methodName, (intern(name), data), start, end)
+            continue
+        positions = _glyphArguments.get(event[0])
+        if positions is None:
+            positions = _nameArguments.get(event[0])
+        if positions is not None:
+            methodName, arguments, start, end = event
+            arguments = list(arguments)
+            for position in positions:
+                arguments[position] = _internItems(arguments[position], intern)
+            event = (methodName, tuple(arguments), start, end)
+        yield event
+
+# the keywords between the target and
+# the replacement of a substitution
+_substitutionSeparators = ("by", "from")
+
+def _glyphTokenIndexes(methodName, tokens, start, end):
+    # yield the indexes of the glyph and class tokens in a
+    # statement that the parser turned into a glyph event.
+    # end is the index of the ;
+    separator = False
+    if methodName != "classDefinition":
+        # skip the keywords and the by or from
+        keyword = tokens[start][1]
+        if keyword in ("ignore", "enum", "enumerate"):
+            start += 1
+        start += 1
+        separator = methodName.startswith("gsub") and keyword != "ignore"
+        # skip the value
+        if methodName.startswith("gpos"):
+            end -= 1
+    for index in range(start, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType not in glyphTokenTypes:
+            continue
+        if separator and tokenType == NAME and value in _substitutionSeparators:
+            separator = False
+            continue
+        yield index
+
+def _glyphClassDefIndexes(tokens, start, end):
+    # yield the indexes of the glyph and class tokens
+    # in the GlyphClassDef statements of a GDEF table.
+    keyword = None
+    for index in range(start, end):
+        tokenType, value = tokens[index][:2]
+        if tokenType == SYMBOL and value in ";{}":
+            keyword = None
+        elif keyword is None:
+            keyword = value
+        elif keyword == "GlyphClassDef" and tokenType in glyphTokenTypes:
+            yield index
+
+def renameFeatureText(text, remap):
+    """
+    Rename the glyphs in text and return the new text. remap
+    is a dictionary of {beforeName:afterName} or a GlyphRemap.
+
+    Only the glyph and class names in statements that the
+    parser reads, and in the GlyphClassDef of a GDEF table,
+    are rewritten. Everything else, including
+    comments, strings, whitespace and keywords, is copied
+    as it is. Syntax errors are raised as in parseFeatures.
+    """
+    if not isinstance(remap, GlyphRemap):
+        remap = GlyphRemap(remap)
+    rename = remap.rename
+    tokens = list(tokenize(text))
+    braces = _matchBraces(tokens)
+    tokenStarts = [token[2] for token in tokens]
+    parts = []
+    copied = 0
+    for methodName, arguments, start, end in _parseUnknown(tokens, 0, len(tokens), braces):
+        if methodName == "table":
+            if arguments[0] != "GDEF":
+                continue
+        elif methodName not in _glyphArguments and methodName != "gposType1":
+            continue
+        first = bisect_left(tokenStarts, start)
+        last = bisect_left(tokenStarts, end) - 1
+        if methodName == "table":
+            indexes = _glyphClassDefIndexes(tokens, first, last)
+        else:
+            indexes = _glyphTokenIndexes(methodName, tokens, first, last)
+        for index in indexes:
+            tokenType, value, tokenStart, tokenEnd = tokens[index]
+            newValue = rename(value)
+            if newValue == value:
+                continue
+            parts.append(text[copied:tokenStart])
+            parts.append(newValue)
+            copied = tokenEnd
+    parts.append(text[copied:])
+    return "".join(parts)
+
+def classTableEvents(events, classTable):
+    """
+    Pass events through and keep a classes.ClassTable up to
+    date with them. Each class is flattened when it is defined,
+    so a class that uses an undefined class raises a syntax
+    error. A scope is opened for every feature and lookup block.
+    """
+    for event in events:
+        methodName = event[0]
+        if methodName == "classDefinition":
+            name, contents = event[1]
+            classTable.define(name, contents)
+            try:
+                classTable.flatten(name)
+            except KeyError as error:
+                raise FeaToolsParserSyntaxError("Undefined class: %s" % error.args[0])
+            except ValueError as error:
+                raise FeaToolsParserSyntaxError(str(error))
+        elif methodName == "feature" or methodName == "lookup":
+            classTable.openScope()
+        elif methodName == endBlockEvent:
+            classTable.closeScope()
+        yield event
+
+# the arguments of each method that hold one item, which can be
+# an inline class, and the arguments that hold glyph sequences.
+_inlineClassArguments = {
+    "gsubType1" : ((0, 1), ()),
+    "gsubType2" : ((0,), (1,)),
+    "gsubType3" : ((0,), ()),
+    "gsubType4" : ((1,), (0,)),
+    "gsubType6" : ((3,), (0, 1, 2)),
+    "gposType2" : ((), (0,)),
+}
+
+def glyphSetEvents(events, glyphNameTable):
+    """
+    Replace the contents of class definitions and the inline
+    classes in events with GlyphSets on glyphNameTable. The
+    classes used in them are expanded, following the scope of
+    the feature and lookup blocks.
+    """
+    # the sets of the classes in each open scope
+    scopes = [{}]
+
+    def makeGlyphSet(contents):
+        glyphSet = GlyphSet(glyphNameTable, [item for item in contents if not item.startswith("@")])
+        for item in contents:
+            if not item.startswith("@"):
+                continue
+            for scope in reversed(scopes):
+                if item in scope:
+                    glyphSet |= scope[item]
+                    break
+            else:
+                raise FeaToolsParserSyntaxError("Undefined class: %s" % item)
+        return glyphSet
+
+    def convertItem(item):
+        if isinstance(item, list):
+            return makeGlyphSet(item)
+        return item
+
+    for event in events:
+        methodName = event[0]
+        if methodName == "classDefinition":
+            methodName, (name, contents), start, end = event
+            glyphSet = makeGlyphSet(contents)
+            scopes[-1][name] = glyphSet
+            event = (methodName, (name, glyphSet), start, end)
+        elif methodName == "feature" or methodName == "lookup":
+            scopes.append({})
+        elif methodName == endBlockEvent:
+            scopes.pop()
+        elif methodName in _inlineClassArguments:
+            itemPositions, sequencePositions = _inlineClassArguments[methodName]
+            methodName, arguments, start, end = event
+            arguments = list(arguments)
+            for position in itemPositions:
+                arguments[position] = convertItem(arguments[position])
+            for position in sequencePositions:
+                arguments[position] = [convertItem(item) for item in arguments[position]]
+            event = (methodName, tuple(arguments), start, end)
+        yield event
+
+def playFeatureEvents(writer, events):
+    """
+    Make the writer calls described by events. If the writer
+    has a classTable, the classes are added to it before
+    the writer calls for them are made. If the writer has
+    useGlyphSets set, classes are passed as GlyphSets and if
+    it has useGlyphIds set, glyph and class names are passed
+    as ids in the writer's glyphNameTable.
+    """
+    classTable = getattr(writer, "classTable", None)
+    if classTable is not None:
+        events = classTableEvents(events, classTable)
+    if getattr(writer, "useGlyphSets", False):
+        events = glyphSetEvents(events, writer.glyphNameTable)
+    if getattr(writer, "useGlyphIds", False):
+        events = glyphIdEvents(events, writer.glyphNameTable)
+    writers = [writer]
+    for methodName, arguments, start, end in events:
+        if methodName == endBlockEvent:
+            writers.pop()
+            continue
+        result = getattr(writers[-1], methodName)(*arguments)
+        if methodName == "feature" or methodName == "lookup":
+            writers.append(result)
+
+def parseFeatures(writer, text, resolveIncludes=False, includeRoots=(), workers=0, profiler=None):
+    """
+    Parse text and make the writer calls. If resolveIncludes
+    is True the included files are found in includeRoots,
+    parsed and passed to the writer in place of the include
+    calls. See resolveIncludeEvents.
+
+    If workers is not 0 the text is parsed in a process pool
+    with that many processes (None for one per CPU) and the
+    writer calls are made in this process, in source order.
+    See parseFeatureEventsParallel.
+
+    If a profiler.FeatureParseProfiler is given the text
+    is parsed in this process and the profiler measures
+    the time spent on each kind of statement and block.
+    A profiler can't be used with workers.
+    """
+    if profiler is not None and workers != 0:
+        raise ValueError("A profiler can't be used with workers.")
+    glyphNameTable = getattr(writer, "glyphNameTable", None)
+    if profiler is not None:
+        events = profiler.parseFeatureEvents(text, glyphNameTable=glyphNameTable)
+    elif workers == 0:
+        events = parseFeatureEvents(text, glyphNameTable=glyphNameTable)
+    else:
+        events = parseFeatureEventsParallel(text, workers)
+        if glyphNameTable is not None:
+            events = internEvents(events, glyphNameTable)
+    if resolveIncludes:
+        events = resolveIncludeEvents(events, includeRoots)
+    playFeatureEvents(writer, events)
+
+def parseFeaturesToAST(text, resolveIncludes=False, includeRoots=(), glyphNameTable=None):
+    """
+    Parse text and return a FeatureFile (see featureTree).
+    The tree can be walked with any writer as many times
+    as needed without parsing the text again.
+    """
+    events = parseFeatureEvents(text, glyphNameTable=glyphNameTable)
+    if resolveIncludes:
+        events = resolveIncludeEvents(events, includeRoots)
+    return buildFeatureTree(events)
+
+def _iterRead(read, chunkSize):
+    while True:
+        chunk = read(chunkSize)
+        if not chunk:
+            break
+        yield chunk
+
+def _readChunks(source, chunkSize):
+    # read strings from a file object or an iterable.
+    # bytes are decoded as UTF-8.
+    read = getattr(source, "read", None)
+    if read is not None:
+        source = _iterRead(read, chunkSize)
+    decoder = None
+    for chunk in source:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if decoder is not None:
+        chunk = decoder.decode(b"", True)
+        if chunk:
+            yield chunk
+
+def _splitTopLevel(tokens):
+    # group tokens into top level statements and
+    # blocks. a group ends with a ; that is not
+    # within a block.
+    group = []
+    depth = 0
+    for token in tokens:
+        group.append(token)
+        if token[0] != SYMBOL:
+            continue
+        value = token[1]
+        if value == "{":
+            depth += 1
+        elif value == "}":
+            depth -= 1
+        elif value == ";" and depth <= 0:
+            yield group
+            group = []
+    if group:
+        yield group
+
+def _parseTopLevel(tokens):
+    # parse a token iterator one top level
+    # statement or block at a time.
+    for group in _splitTopLevel(tokens):
+        braces = _matchBraces(group)
+        for event in _parseUnknown(group, 0, len(group), braces):
+            yield event
+
+def parseFeatureEventsStream(source, chunkSize=65536, glyphNameTable=None):
+    """
+    Parse a file object, or an iterable of strings, and yield
+    the same events as parseFeatureEvents. The text is read
+    chunkSize characters at a time and is parsed one top level
+    statement or block at a time, so only the largest of those
+    has to fit in memory.
+    """
+    tokens = tokenizeChunks(_readChunks(source, chunkSize), glyphNameTable=glyphNameTable)
+    return _parseTopLevel(tokens)
+
+def parseFeaturesStream(writer, source, chunkSize=65536):
+    """
+    Parse a file object, or an iterable of strings, and make
+    the writer calls as parseFeatures does. The text is read
+    as in parseFeatureEventsStream.
+    """
+    glyphNameTable = getattr(writer, "glyphNameTable", None)
+    playFeatureEvents(writer, parseFeatureEventsStream(source, chunkSize, glyphNameTable=glyphNameTable))
+
+def parseFeatureFileEvents(path, mmap=True, glyphNameTable=None):
+    """
+    Parse the feature file at path and yield its events. If
+    mmap is True the file is memory mapped and lexed straight
+    from the mapped bytes, so the pages can be shared between
+    processes parsing the same file. Event offsets are byte
+    offsets in that case. Otherwise the file is read with
+    parseFeatureEventsStream.
+    """
+    with open(path, "rb") as f:
+        if not mmap:
+            for event in parseFeatureEventsStream(f, glyphNameTable=glyphNameTable):
+                yield event
+            return
+        try:
+            buffer = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            return
+        tokens = tokenize(buffer, glyphNameTable=glyphNameTable)
+        try:
+            for event in _parseTopLevel(tokens):
+                yield event
+        finally:
+            # the regex iterator in the tokenizer holds on
+            # to the buffer until the tokenizer is closed.
+            tokens.close()
+            buffer.close()
+
+def parseFeatureFile(writer, path, mmap=True, resolveIncludes=False, includeRoots=()):
+    """
+    Parse the feature file at path and make the writer calls.
+    Relative include paths are looked up next to the including
+    file first and then in includeRoots.
+    """
+    events = parseFeatureFileEvents(path, mmap=mmap, glyphNameTable=getattr(writer, "glyphNameTable", None))
+    if resolveIncludes:
+        path = os.path.realpath(path)
+        events = _resolveIncludes(events, os.path.dirname(path), includeRoots, (path,))
+    playFeatureEvents(writer, events)
+
+# ----------------
+# Include Handling
+# ----------------
+
+# parsed include files.
+# real path : ((modification time, size), events)
+_includeCache = {}
+
+def clearIncludeCache():
+    _includeCache.clear()
+
+def _findInclude(path, directory, includeRoots):
+    if os.path.isabs(path):
+        candidates = [path]
+    else:
+        candidates = []
+        if directory is not None:
+            candidates.append(os.path.join(directory, path))
+        for root in includeRoots:
+            candidates.append(os.path.join(root, path))
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return os.path.realpath(candidate)
+    raise FeaToolsParserSyntaxError("Include not found: %s" % path)
+
+def _getIncludeEvents(path):
+    # a file is parsed once per process for
+    # as long as its mtime and size don't change.
+    stat = os.stat(path)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _includeCache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    events = list(parseFeatureFileEvents(path))
+    _includeCache[path] = (key, events)
+    return events
+
+def _resolveIncludes(events, directory, includeRoots, including):
+    for event in events:
+        if event[0] != "include":
+            yield event
+            continue
+        path = _findInclude(event[1][0], directory, includeRoots)
+        if path in including:
+            cycle = including[including.index(path):] + (path,)
+            raise FeaToolsParserSyntaxError("Include cycle: %s" % " -> ".join(cycle))
+        included = _getIncludeEvents(path)
+        for event in _resolveIncludes(included, os.path.dirname(path), includeRoots, including + (path,)):
+            yield event
+
+def resolveIncludeEvents(events, includeRoots=(), directory=None):
+    """
+    Replace the include events in events with the events of
+    the included files. Relative paths are looked up in
+    directory and then in includeRoots. The paths of nested
+    includes are looked up next to the file that includes them
+    first. Include cycles raise FeaToolsParserSyntaxError.
+
+    Included files are parsed once per process and reused for
+    as long as their real path, modification time and size
+    stay the same. The offsets of events from included files
+    are offsets into those files.
+    """
+    return _resolveIncludes(events, directory, includeRoots, ())
+
+# ----------------
+# Parallel Parsing
+# ----------------
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+
+# slices per worker. more slices than workers
+# keeps the workers busy when the top level
+# blocks differ a lot in size.
+_slicesPerWorker = 4
+
+# braces outside of comments and strings
+_braceRE = re.compile(r"#[^\r\n]*|\"[^\"]*\"|([{}])")
+
+def _splitText(text, count):
+    # return (start, end) offsets for up to count slices of
+    # text. slices are only cut after the ; that ends a top
+    # level block, so every slice holds whole statements and
+    # blocks. only the braces are looked at here. everything
+    # else, including any syntax error, is left to the workers.
+    sliceSize = len(text) // count + 1
+    slices = []
+    start = 0
+    depth = 0
+    position = 0
+    while True:
+        match = _braceRE.search(text, position)
+        if match is None:
+            break
+        position = match.end()
+        brace = match.group(1)
+        if brace is None:
+            continue
+        if brace == "{":
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 0 or position - start < sliceSize:
+            continue
+        # find the ; after } name
+        for token in tokenize(text, position):
+            if token[0] == SYMBOL:
+                if token[1] == ";":
+                    position = token[3]
+                    slices.append((start, position))
+                    start = position
+                break
+    if start < len(text) or not slices:
+        slices.append((start, len(text)))
+    return slices
+
+def _parseSlice(text, offset):
+    # parse a slice of a larger text in a worker process.
+    # the event offsets are made relative to the larger text.
+    # the events are returned marshalled. that is a lot
+    # faster than letting the executor pickle them.
+    events = []
+    for methodName, arguments, start, end in parseFeatureEvents(text):
+        events.append((methodName, arguments, start + offset, end + offset))
+    return marshal.dumps(events)
+
+def parseFeatureEventsParallel(text, workers=None):
+    """
+    Parse text in a process pool and yield the same events
+    as parseFeatureEvents, in the same order. The text is
+    split between top level statements and blocks and the
+    slices are parsed in up to workers processes. None uses
+    one process per CPU.
+
+    The names in the events are not interned in a
+    GlyphNameTable. See internEvents. When concurrent.futures is not
+    available the text is parsed in this process.
+    """
+    if ProcessPoolExecutor is None:
+        for event in parseFeatureEvents(text):
+            yield event
+        return
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    slices = _splitText(text, workers * _slicesPerWorker)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_parseSlice, text[start:end], start) for start, end in slices]
+        # results are yielded in source order as they arrive
+        for future in futures:
+            for event in marshal.loads(future.result()):
+                yield event
+
+# -----------
+# Batch Files
+# -----------
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+def _parseFileEvents(path):
+    # parse a file in a worker. includes are resolved
+    # by the caller so that they are parsed only once.
+    return marshal.dumps(list(parseFeatureFileEvents(path)))
+
+# errors that stop one file of a batch. a file that can't be
+# read or decoded is reported like a file with a syntax error.
+_fileErrors = (FeaToolsParserSyntaxError, EnvironmentError, UnicodeDecodeError)
+
+def _playFile(writerFactory, path, events, resolveIncludes, includeRoots):
+    # returns (writer, None) or (None, error)
+    writer = writerFactory()
+    try:
+        if resolveIncludes:
+            path = os.path.realpath(path)
+            events = _resolveIncludes(events, os.path.dirname(path), includeRoots, (path,))
+        playFeatureEvents(writer, events)
+    except _fileErrors as error:
+        return None, error
+    return writer, None
+
+def parseFeatureFiles(paths, writerFactory, workers=None, threads=False, resolveIncludes=False, includeRoots=()):
+    """
+    Parse many feature files. writerFactory is called with no
+    arguments to make a writer for each file. Returns a list
+    with a (writer, error) tuple for each path, in the order
+    of paths. error is None, or the FeaToolsParserSyntaxError,
+    EnvironmentError or UnicodeDecodeError that stopped the
+    parsing of the file, in which case writer is None. An
+    error in one file doesn't stop the other files.
+
+    The files are parsed in a process pool, or a thread pool
+    if threads is True, with up to workers workers. None uses
+    one per CPU and 0 parses the files one by one in this
+    process. The writer calls are always made in this process.
+    Included files are parsed once for all of the files. See
+    parseFeatureFile.
+    """
+    paths = list(paths)
+    if threads:
+        executorClass = ThreadPoolExecutor
+    else:
+        executorClass = ProcessPoolExecutor
+    results = []
+    if workers == 0 or executorClass is None:
+        for path in paths:
+            try:
+                events = list(parseFeatureFileEvents(path))
+            except _fileErrors as error:
+                results.append((None, error))
+                continue
+            results.append(_playFile(writerFactory, path, events, resolveIncludes, includeRoots))
+        return results
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    with executorClass(max_workers=workers) as executor:
+        futures = [executor.submit(_parseFileEvents, path) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                events = marshal.loads(future.result())
+            except _fileErrors as error:
+                results.append((None, error))
+                continue
+            results.append(_playFile(writerFactory, path, events, resolveIncludes, includeRoots))
+    return results
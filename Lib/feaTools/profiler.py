@@ -0,0 +1,186 @@
+"""
+Profiling for the parser.
+
+Pass a FeatureParseProfiler to parseFeatures to find out where
+the time goes in a slow feature file:
+
+    profiler = FeatureParseProfiler()
+    parseFeatures(writer, myFeatureText, profiler=profiler)
+    print(profiler.formatReport())
+
+The parser makes one event per statement (see
+parser.parseFeatureEvents) and only parses a statement when
+its event is asked for. The time the profiler spends waiting
+for an event is the time it took to parse the statement, and
+the time until the next event is asked for is the time the
+writer took. Lexing is timed separately.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+import time
+from .featureTree import endBlockEvent
+from .lexer import tokenize
+from .parser import _matchBraces, _parseUnknown
+
+try:
+    _timer = time.perf_counter
+except AttributeError:
+    _timer = time.time
+
+
+class _RuleStatistics(object):
+
+    __slots__ = ("count", "time", "writerTime", "size", "maxSize", "maxDepth")
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.writerTime = 0.0
+        self.size = 0
+        self.maxSize = 0
+        self.maxDepth = 0
+
+    def asDict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class _BlockStatistics(object):
+
+    __slots__ = ("keyword", "name", "start", "end", "depth", "count", "time", "writerTime")
+
+    def __init__(self, keyword, name, start, end, depth):
+        self.keyword = keyword
+        self.name = name
+        self.start = start
+        self.end = end
+        self.depth = depth
+        self.count = 0
+        self.time = 0.0
+        self.writerTime = 0.0
+
+    def asDict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class FeatureParseProfiler(object):
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.lexTime = 0.0
+        self.tokenCount = 0
+        self.size = 0
+        self.maxDepth = 0
+        # method name : _RuleStatistics
+        self.rules = {}
+        # _BlockStatistics in source order
+        self.blocks = []
+
+    def parseFeatureEvents(self, text, glyphNameTable=None):
+        """
+        The same as parser.parseFeatureEvents, with the
+        lexing and the parsing of the events measured.
+        Measurements add up over calls until reset.
+        """
+        start = _timer()
+        tokens = list(tokenize(text, glyphNameTable=glyphNameTable))
+        braces = _matchBraces(tokens)
+        self.lexTime += _timer() - start
+        self.tokenCount += len(tokens)
+        self.size += len(text)
+        return self._profileEvents(_parseUnknown(tokens, 0, len(tokens), braces))
+
+    def _profileEvents(self, events):
+        rules = self.rules
+        # the blocks that are open
+        openBlocks = []
+        events = iter(events)
+        while True:
+            start = _timer()
+            try:
+                event = next(events)
+            except StopIteration:
+                break
+            parseTime = _timer() - start
+            methodName, arguments, eventStart, eventEnd = event
+            if methodName == endBlockEvent:
+                block = openBlocks.pop()
+            else:
+                rule = rules.get(methodName)
+                if rule is None:
+                    rule = rules[methodName] = _RuleStatistics()
+                size = eventEnd - eventStart
+                rule.count += 1
+                rule.time += parseTime
+                rule.size += size
+                rule.maxSize = max(rule.maxSize, size)
+                rule.maxDepth = max(rule.maxDepth, len(openBlocks))
+            for block in openBlocks:
+                if methodName != endBlockEvent:
+                    block.count += 1
+                block.time += parseTime
+            if methodName == "feature" or methodName == "lookup":
+                block = _BlockStatistics(methodName, arguments[0], eventStart, eventEnd, len(openBlocks))
+                self.blocks.append(block)
+                openBlocks.append(block)
+                self.maxDepth = max(self.maxDepth, len(openBlocks))
+            start = _timer()
+            yield event
+            writerTime = _timer() - start
+            if methodName != endBlockEvent:
+                rule.writerTime += writerTime
+            for block in openBlocks:
+                block.writerTime += writerTime
+
+    def report(self):
+        """
+        Get the measurements as a dictionary of plain values:
+
+        lexTime, tokenCount, size
+            the time spent lexing, the number of tokens
+            and the number of characters lexed.
+        maxDepth
+            the deepest nesting of feature and lookup blocks.
+        rules
+            a dictionary with a dictionary of count, time,
+            writerTime, size, maxSize and maxDepth for each
+            writer method. size is the number of characters
+            of text the statements span.
+        blocks
+            a list with a dictionary of keyword, name, start,
+            end, depth, count, time and writerTime for each
+            feature and lookup block, in source order. count
+            is the number of statements in the block. The
+            counts and times include nested blocks.
+        """
+        rules = dict((methodName, rule.asDict()) for methodName, rule in self.rules.items())
+        return dict(
+            lexTime=self.lexTime,
+            tokenCount=self.tokenCount,
+            size=self.size,
+            maxDepth=self.maxDepth,
+            rules=rules,
+            blocks=[block.asDict() for block in self.blocks]
+        )
+
+    def formatReport(self, blockCount=10):
+        """
+        Get a text summary of the report with the rules
+        and the blockCount slowest blocks.
+        """
+        lines = []
+        lines.append("lexing: %.4fs for %d tokens in %d characters" % (self.lexTime, self.tokenCount, self.size))
+        lines.append("maximum depth: %d" % self.maxDepth)
+        lines.append("")
+        lines.append("%-16s %8s %10s %10s %10s %6s" % ("rule", "count", "parse", "writer", "size", "depth"))
+        for methodName, rule in sorted(self.rules.items(), key=lambda item: -item[1].time):
+            lines.append("%-16s %8d %10.4f %10.4f %10d %6d" % (methodName, rule.count, rule.time, rule.writerTime, rule.size, rule.maxDepth))
+        if self.blocks:
+            lines.append("")
+            lines.append("%-24s %8s %10s %10s %10s" % ("block", "count", "parse", "writer", "offset"))
+            blocks = sorted(self.blocks, key=lambda block: -block.time)[:blockCount]
+            for block in blocks:
+                name = "%s %s" % (block.keyword, block.name)
+                lines.append("%-24s %8d %10.4f %10.4f %10d" % (name, block.count, block.time, block.writerTime, block.start))
+        return "\n".join(lines)
@@ -1,7 +1,32 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 import unittest
-from .parser import parseFeatures
+import io
+import json
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+from .parser import _splitText, _parseSlice, parseFeatures, renameFeatureText, parseFeaturesToAST, parseFeatureEvents, parseFeaturesStream, parseFeatureEventsStream, parseFeatureFile, parseFeatureFiles, clearIncludeCache, FeaToolsParserSyntaxError
+from .lexer import tokenize, tokenizeChunks
+from .classes import ClassIndex, ClassTable
+from .cache import FeatureParseCache
+from .glyphNameTable import GlyphNameTable
+from .glyphRemap import GlyphRemap
+from .glyphSet import GlyphSet
+from .incremental import IncrementalFeatureParser
+from .benchmark.corpora import corpora, makeCorpus
+from .benchmark.harness import runBenchmarks, compareResults
+from .profiler import FeatureParseProfiler
+from .featureTree import FeatureBlock, LookupBlock, ClassDef, Language, LookupFlag, SingleSub, PairPos
 from .writers.baseWriter import AbstractFeatureWriter
+from .writers.featestWriter import FeatestWriter
+from .writers.fdkSyntaxWriter import FDKSyntaxFeatureWriter
+from .writers.glyphRenameWriter import GlyphRenameFeatureWriter
+from .writers import kerningExpansionWriter
+from .writers.kerningExpansionWriter import KerningExpansionWriter
+from .writers.kerningTableWriter import KerningTableWriter
+from .writers.recordingWriter import RecordingFeatureWriter
 
 
 class TestFeatureWriter(AbstractFeatureWriter):
@@ -80,6 +105,28 @@ class TestFeatureWriter(AbstractFeatureWriter):
         self._instructions.append(("feature reference", name))
 
 
+def uninternedNames(writer, table):
+    # the names in the data of a TestFeatureWriter that
+    # are in a GlyphNameTable but aren't the table's copies
+    names = []
+    items = []
+    blocks = [writer.getData()]
+    while blocks:
+        for token, obj in blocks.pop():
+            if token == "feature" or token == "lookup":
+                items.append(obj[0])
+                blocks.append(obj[1])
+            else:
+                items.append(obj)
+    while items:
+        item = items.pop()
+        if isinstance(item, (list, tuple)):
+            items.extend(item)
+        elif isinstance(item, type("")) and table._strings.get(item, item) is not item:
+            names.append(item)
+    return names
+
+
 class TestRead(unittest.TestCase):
 
     def testLanguageSystem(self):
@@ -207,6 +254,33 @@ class TestRead(unittest.TestCase):
                 ]))]
         self.assertEqual(result, expected)
 
+    def testUnbalancedBlocks(self):
+        for test in [
+                "feature test { sub foo by bar; } tset;",
+                "feature test { sub foo by bar; test;",
+                "feature test { lookup TEST { } test;",
+                "sub foo by bar; } test;",
+                "feature test { sub foo by bar } test;",
+                ]:
+            writer = TestFeatureWriter()
+            self.assertRaises(FeaToolsParserSyntaxError, parseFeatures, writer, test)
+        #
+        test = """
+        feature test {
+            lookup TEST { sub foo by bar; } TEST;
+            lookup test { sub bar by foo; } test;
+        } test;
+        """
+        writer = TestFeatureWriter()
+        parseFeatures(writer, test)
+        result = writer.getData()
+        expected = [
+                ("feature", ("test", [
+                ("lookup", ("TEST", [("gsub type 1", ("foo", "bar"))])),
+                ("lookup", ("test", [("gsub type 1", ("bar", "foo"))]))
+                ]))]
+        self.assertEqual(result, expected)
+
     def testTableBlocks(self):
         test = """
         table test {
@@ -958,5 +1032,1065 @@ class TestRead(unittest.TestCase):
         self.assertEqual(result, expected)
 
 
+class TestTokenize(unittest.TestCase):
+
+    def testTokens(self):
+        test = """enum pos @foo [bar bar.alt] -100; # comment"""
+        result = [(tokenType, value) for tokenType, value, start, end in tokenize(test)]
+        expected = [
+                ("name", "enum"),
+                ("name", "pos"),
+                ("class", "@foo"),
+                ("symbol", "["),
+                ("name", "bar"),
+                ("name", "bar.alt"),
+                ("symbol", "]"),
+                ("number", "-100"),
+                ("symbol", ";")
+                ]
+        self.assertEqual(result, expected)
+        #
+        test = """pos foo <-10 0 -10 0>; include( ../foo.fea );"""
+        result = [(tokenType, value) for tokenType, value, start, end in tokenize(test)]
+        expected = [
+                ("name", "pos"),
+                ("name", "foo"),
+                ("value", "-10 0 -10 0"),
+                ("symbol", ";"),
+                ("include", "../foo.fea"),
+                ("symbol", ";")
+                ]
+        self.assertEqual(result, expected)
+
+    def testOffsets(self):
+        test = """sub f' i by f.alt;"""
+        result = [test[start:end] for tokenType, value, start, end in tokenize(test)]
+        expected = ["sub", "f", "'", "i", "by", "f.alt", ";"]
+        self.assertEqual(result, expected)
+
+    def testCommentsAndStrings(self):
+        test = """
+        # it's "quoted
+        sub foo by bar; # "
+        """
+        writer = TestFeatureWriter()
+        parseFeatures(writer, test)
+        result = writer.getData()
+        expected = [
+                ("gsub type 1", ("foo", "bar"))
+                ]
+        self.assertEqual(result, expected)
+
+
+class TestEvents(unittest.TestCase):
+
+    def testSourceOrder(self):
+        test = """
+        @A = [a b];
+        feature test {
+            sub a by b;
+            lookup TEST { pos a b 10; } TEST;
+            script latn;
+        } test;
+        languagesystem DFLT dflt;
+        """
+        result = [methodName for methodName, arguments, start, end in parseFeatureEvents(test)]
+        expected = [
+                "classDefinition",
+                "feature",
+                "gsubType1",
+                "lookup",
+                "gposType2",
+                "endBlock",
+                "script",
+                "endBlock",
+                "languageSystem"
+                ]
+        self.assertEqual(result, expected)
+
+    def testOffsets(self):
+        test = """feature test {sub foo by bar; # comment
+        pos foo bar -10;} test;"""
+        result = [(methodName, test[start:end]) for methodName, arguments, start, end in parseFeatureEvents(test)]
+        expected = [
+                ("feature", test),
+                ("gsubType1", "sub foo by bar;"),
+                ("gposType2", "pos foo bar -10;"),
+                ("endBlock", "} test;")
+                ]
+        self.assertEqual(result, expected)
+
+
+class TestStream(unittest.TestCase):
+
+    text = """
+    languagesystem DFLT dflt; # comment with ; and "
+    @A = [a b];
+    table OS/2 { Vendor "te;st"; FSType 0; } OS/2;
+    feature test {
+        featureNames { name "x;y"; };
+        sub foo by bar;
+        lookup TEST { pos foo bar -10; pos foo <1 2 3 4>; } TEST;
+    } test;
+    include(foo.fea) sub bar by foo;
+    """
+
+    def testChunkBoundaries(self):
+        expected = list(parseFeatureEvents(self.text))
+        for chunkSize in (1, 2, 3, 7, 64, 4096):
+            result = list(parseFeatureEventsStream(io.StringIO(self.text), chunkSize))
+            self.assertEqual(result, expected)
+            result = list(parseFeatureEventsStream(io.BytesIO(self.text.encode("utf-8")), chunkSize))
+            self.assertEqual(result, expected)
+
+    def testLongStatement(self):
+        text = "@A = [%s]; sub a by b;" % " ".join(["glyph%d" % i for i in range(5000)])
+        chunks = [text[i:i + 2] for i in range(0, len(text), 2)]
+        self.assertEqual(list(tokenizeChunks(chunks)), list(tokenize(text)))
+        # tokens come out before the statement ends.
+        read = []
+        def readChunks():
+            for chunk in chunks:
+                read.append(chunk)
+                yield chunk
+        tokens = tokenizeChunks(readChunks())
+        for i in range(10):
+            next(tokens)
+        self.assertTrue(len(read) < 40)
+        # cut strings, value records and include paths
+        text = 'pos a <1 2 3 4>; name "a;b"; include (foo.fea) sub a by b;'
+        for chunkSize in (1, 2, 3):
+            chunks = [text[i:i + chunkSize] for i in range(0, len(text), chunkSize)]
+            self.assertEqual(list(tokenizeChunks(chunks)), list(tokenize(text)))
+
+    def testIterable(self):
+        writer = TestFeatureWriter()
+        parseFeatures(writer, self.text)
+        expected = writer.getData()
+        writer = TestFeatureWriter()
+        parseFeaturesStream(writer, self.text.splitlines(True))
+        result = writer.getData()
+        self.assertEqual(result, expected)
+
+
+class TestFeatureFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _writeFile(self, fileName, text):
+        path = os.path.join(self.directory, fileName)
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def testMemoryMap(self):
+        path = self._writeFile("test.fea", TestStream.text)
+        writer = TestFeatureWriter()
+        parseFeatures(writer, TestStream.text)
+        expected = writer.getData()
+        for mmap in (True, False):
+            writer = TestFeatureWriter()
+            parseFeatureFile(writer, path, mmap=mmap)
+            result = writer.getData()
+            self.assertEqual(result, expected)
+
+    def testMemoryMapNonASCII(self):
+        text = "sub \u00e9 by b;\nsub\u00a0c by d;"
+        path = self._writeFile("test.fea", text)
+        writer = TestFeatureWriter()
+        parseFeatures(writer, text)
+        expected = writer.getData()
+        for mmap in (True, False):
+            writer = TestFeatureWriter()
+            parseFeatureFile(writer, path, mmap=mmap)
+            self.assertEqual(writer.getData(), expected)
+        path = self._writeFile("unknown.fea", "sub \u2192 by b;")
+        for mmap in (True, False):
+            self.assertRaises(FeaToolsParserSyntaxError, parseFeatureFile, TestFeatureWriter(), path, mmap=mmap)
+
+    def testIncludes(self):
+        clearIncludeCache()
+        os.mkdir(os.path.join(self.directory, "shared"))
+        self._writeFile(os.path.join("shared", "classes.fea"), "@A = [a b];\ninclude(kern.fea);")
+        self._writeFile(os.path.join("shared", "kern.fea"), "pos @A b -10;")
+        path = self._writeFile("master.fea", "include(shared/classes.fea);\nfeature kern { include(shared/kern.fea) } kern;")
+        expected = [
+                ("class", ("@A", ["a", "b"])),
+                ("gpos type 2", (["@A", "b"], -10.0)),
+                ("feature", ("kern", [
+                ("gpos type 2", (["@A", "b"], -10.0))
+                ]))]
+        writer = TestFeatureWriter()
+        parseFeatureFile(writer, path, resolveIncludes=True)
+        self.assertEqual(writer.getData(), expected)
+        #
+        writer = TestFeatureWriter()
+        parseFeatures(writer, "include(kern.fea);", resolveIncludes=True, includeRoots=[os.path.join(self.directory, "shared")])
+        self.assertEqual(writer.getData(), [("gpos type 2", (["@A", "b"], -10.0))])
+        # a changed file is parsed again
+        self._writeFile(os.path.join("shared", "kern.fea"), "pos @A cc -20;")
+        writer = TestFeatureWriter()
+        parseFeatures(writer, "include(kern.fea);", resolveIncludes=True, includeRoots=[os.path.join(self.directory, "shared")])
+        self.assertEqual(writer.getData(), [("gpos type 2", (["@A", "cc"], -20.0))])
+
+    def testIncludeErrors(self):
+        clearIncludeCache()
+        self._writeFile("a.fea", "include(b.fea);")
+        path = self._writeFile("b.fea", "include(a.fea);")
+        writer = TestFeatureWriter()
+        self.assertRaises(FeaToolsParserSyntaxError, parseFeatureFile, writer, path, resolveIncludes=True)
+        writer = TestFeatureWriter()
+        self.assertRaises(FeaToolsParserSyntaxError, parseFeatures, writer, "include(missing.fea);", resolveIncludes=True, includeRoots=[self.directory])
+
+    def testParseFeatureFiles(self):
+        clearIncludeCache()
+        self._writeFile("kern.fea", "pos a b -10;")
+        paths = [
+            self._writeFile("a.fea", "feature kern { include(kern.fea); } kern;"),
+            self._writeFile("b.fea", "sub a by;"),
+            self._writeFile("c.fea", "include(kern.fea); sub a by b;")
+        ]
+        for workers, threads in ((0, False), (2, False), (2, True)):
+            results = parseFeatureFiles(paths, TestFeatureWriter, workers=workers, threads=threads, resolveIncludes=True)
+            self.assertEqual(len(results), 3)
+            writer, error = results[0]
+            self.assertEqual(error, None)
+            self.assertEqual(writer.getData(), [("feature", ("kern", [("gpos type 2", (["a", "b"], -10.0))]))])
+            writer, error = results[1]
+            self.assertEqual(writer, None)
+            self.assertTrue(isinstance(error, FeaToolsParserSyntaxError))
+            writer, error = results[2]
+            self.assertEqual(writer.getData(), [("gpos type 2", (["a", "b"], -10.0)), ("gsub type 1", ("a", "b"))])
+
+    def testParseFeatureFilesErrors(self):
+        path = os.path.join(self.directory, "bad.fea")
+        with open(path, "wb") as f:
+            f.write(b"sub a\xe9 by b;")
+        paths = [
+            os.path.join(self.directory, "missing.fea"),
+            path,
+            self._writeFile("a.fea", "sub a by b;"),
+            self._writeFile("b.fea", "include(missing.fea);"),
+        ]
+        for workers, threads in ((0, False), (2, False), (2, True)):
+            results = parseFeatureFiles(paths, TestFeatureWriter, workers=workers, threads=threads, resolveIncludes=True)
+            self.assertEqual(len(results), 4)
+            writer, error = results[0]
+            self.assertEqual(writer, None)
+            self.assertTrue(isinstance(error, EnvironmentError))
+            writer, error = results[1]
+            self.assertTrue(isinstance(error, UnicodeDecodeError))
+            writer, error = results[2]
+            self.assertEqual(writer.getData(), [("gsub type 1", ("a", "b"))])
+            writer, error = results[3]
+            self.assertEqual(writer, None)
+            self.assertNotEqual(error, None)
+
+    def testEmptyFile(self):
+        path = self._writeFile("empty.fea", "")
+        writer = TestFeatureWriter()
+        parseFeatureFile(writer, path)
+        self.assertEqual(writer.getData(), [])
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testReplay(self):
+        cache = FeatureParseCache(self.directory)
+        writer = TestFeatureWriter()
+        parseFeatures(writer, TestStream.text)
+        expected = writer.getData()
+        self.assertEqual(cache.get(TestStream.text), None)
+        writer = TestFeatureWriter()
+        cache.parseFeatures(writer, TestStream.text)
+        self.assertEqual(writer.getData(), expected)
+        self.assertEqual(cache.get(TestStream.text), list(parseFeatureEvents(TestStream.text)))
+        writer = TestFeatureWriter()
+        cache.parseFeatures(writer, TestStream.text)
+        self.assertEqual(writer.getData(), expected)
+
+    def testGlyphNameTable(self):
+        cache = FeatureParseCache(self.directory)
+        table = GlyphNameTable()
+        writer = TestFeatureWriter()
+        writer.glyphNameTable = table
+        parseFeatures(writer, TestStream.text)
+        for i in range(2):
+            writer = TestFeatureWriter()
+            writer.glyphNameTable = table
+            cache.parseFeatures(writer, TestStream.text)
+            self.assertEqual(uninternedNames(writer, table), [])
+
+    def testEviction(self):
+        cache = FeatureParseCache(self.directory)
+        texts = ["sub a by b;", "sub b by c;", "sub c by d;"]
+        for index, text in enumerate(texts):
+            cache.parseFeatureEvents(text)
+            path = cache._path(cache._key(text))
+            os.utime(path, (index, index))
+        # use the first entry so that the second is the oldest
+        cache.get(texts[0])
+        cache.maxSize = sum([os.path.getsize(os.path.join(self.directory, fileName)) for fileName in os.listdir(self.directory)]) - 1
+        cache.prune()
+        self.assertNotEqual(cache.get(texts[0]), None)
+        self.assertEqual(cache.get(texts[1]), None)
+        self.assertNotEqual(cache.get(texts[2]), None)
+
+
+class TestRecordingWriter(unittest.TestCase):
+
+    def testReplay(self):
+        text = TestStream.text + """
+        table head { FontRevision 1.1; } head;
+        table OS/2 { Panose 0 1 2 3 4 5 6 7 8 9; } OS/2;
+        lookupflag RightToLeft, IgnoreMarks;
+        sub f o' o' b by o_o.alt;
+        ignore sub [foo bar]' bar;
+        enum pos foo [bar bar.alt] -100;
+        language TRK exclude_dflt;
+        ;
+        """
+        writer = TestFeatureWriter()
+        parseFeatures(writer, text)
+        expected = writer.getData()
+        recorder = RecordingFeatureWriter()
+        parseFeatures(recorder, text)
+        for i in range(2):
+            writer = TestFeatureWriter()
+            recorder.replay(writer)
+            self.assertEqual(writer.getData(), expected)
+        # only glyph and class names get ids
+        table = recorder.glyphNameTable
+        for name in ("foo", "@A", "o_o.alt"):
+            self.assertTrue(name in table)
+        for name in ("DFLT", "dflt", "test", "TEST", "head", "foo.fea"):
+            self.assertFalse(name in table)
+
+    def testInterleavedBlocks(self):
+        recorder = RecordingFeatureWriter()
+        feature = recorder.feature("test")
+        recorder.classDefinition("@A", ["a", "b"])
+        feature.gsubType1("@A", "b")
+        writer = TestFeatureWriter()
+        recorder.replay(writer)
+        expected = [
+                ("feature", ("test", [("gsub type 1", ("@A", "b"))])),
+                ("class", ("@A", ["a", "b"]))
+                ]
+        self.assertEqual(writer.getData(), expected)
+
+
+class TestGlyphNameTable(unittest.TestCase):
+
+    def testIds(self):
+        table = GlyphNameTable(["a", "b"])
+        self.assertEqual(table.glyphId("b"), 1)
+        self.assertEqual(table.glyphId("@A"), 2)
+        self.assertEqual(table.glyphName(2), "@A")
+        self.assertEqual(table.getGlyphId("c"), None)
+        self.assertEqual(table.glyphIds(["a", ["b", "@A"]]), [0, [1, 2]])
+        self.assertEqual(table.glyphNames([0, [1, 2]]), ["a", ["b", "@A"]])
+
+    def testInterning(self):
+        table = GlyphNameTable()
+        text = "sub %s by %s; sub %s by %s;" % ("".join(["a", "b"]), "c", "".join(["a", "b"]), "c")
+        events = list(parseFeatureEvents(text, glyphNameTable=table))
+        self.assertTrue(events[0][1][0] is events[1][1][0])
+        self.assertEqual(len(table), 0)
+
+    def testWriterIds(self):
+        table = GlyphNameTable()
+
+        class IdWriter(TestFeatureWriter):
+            glyphNameTable = table
+            useGlyphIds = True
+
+        writer = IdWriter()
+        parseFeatures(writer, "@A = [a b]; pos @A [b c] -10;")
+        expected = [
+                ("class", (0, [1, 2])),
+                ("gpos type 2", ([0, [2, 3]], -10.0))
+                ]
+        self.assertEqual(writer.getData(), expected)
+        self.assertEqual(table.glyphName(3), "c")
+
+
+class TestFeatureTree(unittest.TestCase):
+
+    text = """
+    @A = [a b];
+    lookup foo {
+        sub a by b;
+    } foo;
+    feature kern {
+        lookup foo;
+        pos @A [b c] -10;
+        enum pos a [b c] 20;
+    } kern;
+    """
+
+    def testTree(self):
+        tree = parseFeaturesToAST(self.text)
+        statements = tree.statements
+        self.assertEqual(statements[0], ClassDef("@A", ["a", "b"]))
+        self.assertEqual(statements[1], LookupBlock("foo", [SingleSub("a", "b")]))
+        feature = statements[2]
+        self.assertTrue(isinstance(feature, FeatureBlock))
+        self.assertEqual(feature.statements[1], PairPos(["@A", ["b", "c"]], -10.0, False))
+        self.assertEqual(feature.statements[2].needEnum, True)
+        self.assertFalse(hasattr(feature, "__dict__"))
+
+    def testWalk(self):
+        expected = TestFeatureWriter()
+        parseFeatures(expected, self.text)
+        tree = parseFeaturesToAST(self.text)
+        for i in range(2):
+            writer = TestFeatureWriter()
+            tree.walk(writer)
+            self.assertEqual(writer.getData(), expected.getData())
+
+    def testDefaults(self):
+        text = "language DEU; language TRK exclude_dflt; lookupflag 0; lookupflag IgnoreMarks;"
+        tree = parseFeaturesToAST(text)
+        self.assertEqual(tree.statements, [
+            Language("DEU", True),
+            Language("TRK", False),
+            LookupFlag(False, False, False, False),
+            LookupFlag(False, False, False, True),
+        ])
+        self.assertEqual(repr(tree.statements[0]), "Language('DEU', True)")
+        expected = TestFeatureWriter()
+        parseFeatures(expected, text)
+        writer = TestFeatureWriter()
+        tree.walk(writer)
+        self.assertEqual(writer.getData(), expected.getData())
+        self.assertRaises(TypeError, Language)
+
+
+class TestParallel(unittest.TestCase):
+
+    text = """
+    languagesystem DFLT dflt;
+    @A = [a b];
+    feature liga {
+        sub f i by f_i;
+    } liga;
+    # comment with a ; in it
+    lookup foo {
+        pos a b 10;
+    } foo;
+    feature kern {
+        lookup foo;
+        pos @A [b c] -10;
+    } kern;
+    """
+
+    def testSplit(self):
+        slices = _splitText(self.text, 3)
+        self.assertEqual(slices[0][0], 0)
+        self.assertEqual(slices[-1][1], len(self.text))
+        for (start, end), (nextStart, nextEnd) in zip(slices, slices[1:]):
+            self.assertEqual(end, nextStart)
+        events = []
+        for start, end in slices:
+            events.extend(marshal.loads(_parseSlice(self.text[start:end], start)))
+        self.assertEqual(events, list(parseFeatureEvents(self.text)))
+
+    def testWorkers(self):
+        expected = TestFeatureWriter()
+        parseFeatures(expected, self.text)
+        writer = TestFeatureWriter()
+        parseFeatures(writer, self.text, workers=2)
+        self.assertEqual(writer.getData(), expected.getData())
+
+    def testError(self):
+        text = self.text + "feature liga { sub a by; } liga;"
+        writer = TestFeatureWriter()
+        self.assertRaises(FeaToolsParserSyntaxError, parseFeatures, writer, text, workers=2)
+
+    def testGlyphNameTable(self):
+        table = GlyphNameTable()
+        expected = TestFeatureWriter()
+        expected.glyphNameTable = table
+        parseFeatures(expected, self.text)
+        writer = TestFeatureWriter()
+        writer.glyphNameTable = table
+        parseFeatures(writer, self.text, workers=2)
+        self.assertEqual(writer.getData(), expected.getData())
+        self.assertEqual(uninternedNames(writer, table), [])
+        self.assertRaises(ValueError, parseFeatures, writer, self.text, workers=2, profiler=FeatureParseProfiler())
+
+
+class TestIncremental(unittest.TestCase):
+
+    def _assertFullParse(self, parser):
+        self.assertEqual(list(parser.events()), list(parseFeatureEvents(parser.text)))
+
+    def testUpdate(self):
+        text = TestFeatureTree.text
+        parser = IncrementalFeatureParser(text)
+        self._assertFullParse(parser)
+        start = text.index("pos @A")
+        end = text.index(";", start) + 1
+        index = text.index("-10")
+        diff = parser.update([(index, index + 3, "-15")])
+        self._assertFullParse(parser)
+        self.assertEqual(diff, [(
+                ("feature", "kern"),
+                [("gposType2", (["@A", ["b", "c"]], -10.0, False), start, end)],
+                [("gposType2", (["@A", ["b", "c"]], -15.0, False), start, end)]
+                )])
+        diff = parser.update([(0, 0, "languagesystem DFLT dflt;"), (len(parser.text) + 25, len(parser.text) + 25, "feature liga { sub f i by f_i; } liga;")])
+        self._assertFullParse(parser)
+        self.assertEqual([(block, len(removed), len(added)) for block, removed, added in diff], [(None, 0, 1), (("feature", "liga"), 0, 3)])
+
+    def testEdits(self):
+        parser = IncrementalFeatureParser(TestStream.text)
+        edits = [
+            # a comment that hides the end of a block
+            ("} TEST;", "# } TEST;"),
+            ("# } TEST;", "} TEST;"),
+            # a string that spans statements
+            ("@A", "\"@A"),
+            ("\"@A", "@A"),
+            # merge two statements
+            ("dflt;", "dflt"),
+            ("dflt", "dflt;"),
+        ]
+        for old, new in edits:
+            index = parser.text.index(old)
+            try:
+                parser.update([(index, index + len(old), new)])
+                error = None
+            except FeaToolsParserSyntaxError as e:
+                error = str(e)
+            try:
+                expected = list(parseFeatureEvents(parser.text))
+                expectedError = None
+            except FeaToolsParserSyntaxError as e:
+                expectedError = str(e)
+            self.assertEqual(error, expectedError)
+            if error is None:
+                self.assertEqual(list(parser.events()), expected)
+        self._assertFullParse(parser)
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def testCorpora(self):
+        for name in sorted(corpora):
+            text = makeCorpus(name, scale=0.01)
+            self.assertEqual(text, makeCorpus(name, scale=0.01))
+            events = list(parseFeatureEvents(text))
+            self.assertTrue(events)
+
+    def testCompare(self):
+        old = runBenchmarks(["parseFeatures"], ["ligatures"], scale=0.01, repeat=1)
+        new = json.loads(json.dumps(old))
+        self.assertEqual(compareResults(old, new), [])
+        new["results"][0]["bestTime"] = old["results"][0]["bestTime"] * 2 + 1
+        regressions = compareResults(old, new)
+        self.assertEqual([regression[:3] for regression in regressions], [("parseFeatures", "ligatures", "bestTime")])
+
+
+class TestProfiler(unittest.TestCase):
+
+    def testReport(self):
+        profiler = FeatureParseProfiler()
+        expected = TestFeatureWriter()
+        parseFeatures(expected, TestStream.text)
+        writer = TestFeatureWriter()
+        parseFeatures(writer, TestStream.text, profiler=profiler)
+        self.assertEqual(writer.getData(), expected.getData())
+        report = profiler.report()
+        self.assertEqual(report["size"], len(TestStream.text))
+        self.assertEqual(report["maxDepth"], 2)
+        rules = report["rules"]
+        self.assertEqual(rules["gposType2"]["count"], 1)
+        self.assertEqual(rules["gposType2"]["maxDepth"], 2)
+        self.assertEqual(rules["gposType2"]["size"], len("pos foo bar -10;"))
+        self.assertEqual(rules["languageSystem"]["maxDepth"], 0)
+        blocks = [(block["keyword"], block["name"], block["depth"], block["count"]) for block in report["blocks"]]
+        self.assertEqual(blocks, [("feature", "test", 0, 4), ("lookup", "TEST", 1, 2)])
+        self.assertTrue(profiler.formatReport())
+
+
+class TestDeepNesting(unittest.TestCase):
+
+    def testDepth(self):
+        depth = sys.getrecursionlimit() * 2
+        text = "lookup a { " * depth + "sub a by b;" + " } a;" * depth
+        events = list(parseFeatureEvents(text))
+        self.assertEqual(len(events), depth * 2 + 1)
+        self.assertEqual(events[depth][:2], ("gsubType1", ("a", "b")))
+        self.assertEqual(events[-1][:2], ("endBlock", ()))
+        writer = FDKSyntaxFeatureWriter()
+        parseFeaturesToAST(text).walk(writer)
+        lines = writer.write().splitlines()
+        self.assertEqual(lines[depth * 2].strip(), "sub a by b;")
+        self.assertEqual(lines[-1], "} a;")
+        self.assertEqual(len(writer.write(blocks=["a"]).splitlines()), len(lines))
+
+
+class TestFDKSyntaxWriter(unittest.TestCase):
+
+    def testWriteTo(self):
+        writer = FDKSyntaxFeatureWriter()
+        writer.classDefinition("@A", ["a", "b"])
+        feature = writer.feature("kern")
+        lookup = feature.lookup("foo")
+        lookup.gposType2(["@A", ["b", "c"]], -10, True)
+        feature.lookupReference("foo")
+        writer.feature("empty")
+        expected = "\n".join([
+            "@A = [a b];",
+            "",
+            "feature kern {",
+            "",
+            "   lookup foo {",
+            "      enum pos @A [b c] -10;",
+            "   } foo;",
+            "",
+            "   lookup foo;",
+            "} kern;",
+            "",
+            "",
+            "feature empty {",
+            "} empty;",
+            ""
+        ])
+        self.assertEqual(writer.write(), expected)
+        for linesep in ("\n", "\r\n"):
+            f = io.StringIO()
+            writer.writeTo(f, linesep)
+            self.assertEqual(f.getvalue(), writer.write(linesep))
+        expected = "\n".join([
+            "",
+            "   lookup foo {",
+            "      enum pos @A [b c] -10;",
+            "   } foo;",
+            "",
+            "",
+            "feature empty {",
+            "} empty;",
+            ""
+        ])
+        self.assertEqual(writer.write(blocks=["foo", "empty"]), expected)
+
+    def testDeferredFormatting(self):
+        writer = FDKSyntaxFeatureWriter()
+        writer.gsubType2("a", ["b", "c"])
+        writer.subtableBreak()
+        writer.rawText("_formatGsubType1")
+        writer.gsubType6(["a"], [["b", "c"]], [], "d")
+        self.assertEqual(writer.write(), "sub a by b c;\nsubtable;\n_formatGsubType1\nsub a [b c]' by d;")
+
+
+    def testChangedLists(self):
+        writer = FDKSyntaxFeatureWriter()
+        contents = ["a", "b"]
+        target = ["a", ["b", "c"]]
+        writer.classDefinition("@A", contents)
+        writer.gsubType6([], target, [], ["d"])
+        contents.append("c")
+        target[1].append("d")
+        target.append("e")
+        self.assertEqual(writer.write(), "@A = [a b];\nsub a' [b c]' by d;")
+
+
+class TestKerningTableWriter(unittest.TestCase):
+
+    text = """
+    @A = [a b];
+    feature kern {
+        pos @A c -10;
+        enum pos a [c d] 20;
+        pos b c 5;
+        pos @A c -30;
+        pos [x y] z 1;
+    } kern;
+    """
+
+    def testCollect(self):
+        writer = KerningTableWriter()
+        parseFeatures(writer, self.text)
+        self.assertEqual(len(writer), 5)
+        self.assertEqual(list(writer.pairs())[1], ("a", ["c", "d"], 20.0, True))
+        self.assertEqual(writer.left[4], -2)
+        self.assertEqual(writer.kern("@A", "c"), -10.0)
+        self.assertEqual(writer.kern("a", ["c", "d"]), 20.0)
+        self.assertEqual(writer.kern("a", "c"), None)
+        self.assertEqual(writer.kern("q", "c", 0), 0)
+
+    def testEdit(self):
+        writer = KerningTableWriter()
+        parseFeatures(writer, self.text)
+        writer.dedupe()
+        self.assertEqual(len(writer), 4)
+        self.assertEqual(writer.kern("@A", "c"), -10.0)
+        # inline classes have negative ids
+        writer.sort()
+        self.assertEqual([pair[:2] for pair in writer.pairs()], [(["x", "y"], "z"), ("@A", "c"), ("a", ["c", "d"]), ("b", "c")])
+        expected = "\n".join([
+            "pos [x y] z 1;",
+            "pos @A c -10;",
+            "enum pos a [c d] 20;",
+            "pos b c 5;",
+        ])
+        self.assertEqual(writer.write(), expected)
+
+
+class TestGlyphRemap(unittest.TestCase):
+
+    text = """
+    @A = [uni0041 a.alt];
+    feature liga {
+        sub [a.alt b.sc] by [c d];
+        sub f i by f_i.sc;
+        pos uni0041 [a.alt b.sc] -10;
+    } liga;
+    """
+
+    def makeRemap(self):
+        return GlyphRemap(
+            {"a.alt" : "a.ss01", "@A" : "@B"},
+            prefixes={"u" : "x", "uni" : "u"},
+            patterns=[(r"\.sc$", ".smcp")]
+        )
+
+    def testRename(self):
+        remap = self.makeRemap()
+        self.assertEqual(remap.rename("a.alt"), "a.ss01")
+        self.assertEqual(remap.rename("uni0041"), "u0041")
+        self.assertEqual(remap.rename("u0041"), "x0041")
+        self.assertEqual(remap.rename("b.sc"), "b.smcp")
+        self.assertEqual(remap.rename("@A"), "@B")
+        self.assertEqual(remap.rename("@uniA"), "@uniA")
+        self.assertEqual(remap.rename("c"), "c")
+        self.assertEqual(remap.renameItems(["a.alt", ["b.sc", "c"]]), ["a.ss01", ["b.smcp", "c"]])
+        # inline classes are only renamed once
+        self.assertIs(remap.renameItems([["b.sc", "c"]])[0], remap.renameItems([["b.sc", "c"]])[0])
+        self.assertIs(remap.renameItems(["a.alt", ["b.sc", "c"]]), remap.renameItems(["a.alt", ["b.sc", "c"]]))
+
+    def testWriter(self):
+        expected = "\n".join([
+            "@B = [u0041 a.ss01];",
+            "",
+            "feature liga {",
+            "   sub [a.ss01 b.smcp] by [c d];",
+            "   sub f i by f_i.smcp;",
+            "   pos u0041 [a.ss01 b.smcp] -10;",
+            "} liga;",
+            "",
+        ])
+        writer = GlyphRenameFeatureWriter(self.makeRemap())
+        parseFeatures(writer, self.text)
+        self.assertEqual(writer.write(), expected)
+        # replaying into the writer renames too
+        recorder = RecordingFeatureWriter()
+        parseFeatures(recorder, self.text)
+        writer = GlyphRenameFeatureWriter(self.makeRemap())
+        recorder.replay(writer)
+        self.assertEqual(writer.write(), expected)
+        writer = GlyphRenameFeatureWriter({"f_i.sc" : "f_i"})
+        parseFeatures(writer, self.text)
+        self.assertIn("sub f i by f_i;", writer.write())
+
+
+class TestRenameFeatureText(unittest.TestCase):
+
+    text = """# rename a.alt
+@A = [a.alt  b]; # not a.alt
+languagesystem DFLT dflt;
+feature ss01 {
+    featureNames { name "a.alt"; };
+    sub a by a.alt;    # single
+    sub f_i by f i;
+    sub a from [a.alt b];
+    ignore sub a.alt' by;
+    sub a.alt' by b;
+    sub a by by;
+    enum pos a.alt [b by] -10;
+    pos a.alt <0 0 10 0>;
+} ss01;
+"""
+
+    def testRename(self):
+        remap = {"a.alt" : "a.ss01", "by" : "b.y", "from" : "f.rom", "@A" : "@B", "ss01" : "x", "dflt" : "x", "sub" : "x"}
+        expected = """# rename a.alt
+@B = [a.ss01  b]; # not a.alt
+languagesystem DFLT dflt;
+feature ss01 {
+    featureNames { name "a.alt"; };
+    sub a by a.ss01;    # single
+    sub f_i by f i;
+    sub a from [a.ss01 b];
+    ignore sub a.ss01' by;
+    sub a.ss01' by b;
+    sub a by b.y;
+    enum pos a.ss01 [b b.y] -10;
+    pos a.ss01 <0 0 10 0>;
+} ss01;
+"""
+        text = self.text.replace("ignore sub a.alt' by;", "ignore sub a.alt';")
+        expected = expected.replace("ignore sub a.ss01' by;", "ignore sub a.ss01';")
+        self.assertEqual(renameFeatureText(text, remap), expected)
+        self.assertEqual(renameFeatureText(text, {}), text)
+
+    def testSameAsWriter(self):
+        text = makeCorpus("contextual", 0.01)
+        remap = GlyphRemap(patterns=[(r"$", ".x")])
+        writer = GlyphRenameFeatureWriter(remap)
+        parseFeatures(writer, text)
+        expected = FDKSyntaxFeatureWriter()
+        parseFeatures(expected, renameFeatureText(text, remap))
+        self.assertEqual(writer.write(), expected.write())
+
+    def testPositionTarget(self):
+        text = "pos [a b] <0 0 10 0>;\npos @a <0 0 20 0>;\n"
+        remap = {"a" : "x", "@a" : "@x"}
+        self.assertEqual(renameFeatureText(text, remap), "pos [x b] <0 0 10 0>;\npos @x <0 0 20 0>;\n")
+        writer = GlyphRenameFeatureWriter(remap)
+        parseFeatures(writer, text)
+        expected = FDKSyntaxFeatureWriter()
+        parseFeatures(expected, renameFeatureText(text, remap))
+        self.assertEqual(writer.write(), expected.write())
+        self.assertIn("pos [x b] <0 0 10 0>;", writer.write())
+
+    def testGlyphClassDef(self):
+        text = "table GDEF {\n    GlyphClassDef [a b], [c], , @a; # a\n} GDEF;\ntable head { FontRevision 1.1; } head;\n"
+        remap = {"a" : "x", "@a" : "@x", "GDEF" : "y", "GlyphClassDef" : "y", "FontRevision" : "y"}
+        self.assertEqual(renameFeatureText(text, remap), text.replace("[a b], [c], , @a", "[x b], [c], , @x"))
+        writer = GlyphRenameFeatureWriter(remap)
+        parseFeatures(writer, text)
+        self.assertEqual(writer.write(), "table GDEF { GlyphClassDef [x b], [c], , @x; } GDEF;\ntable head { FontRevision 1.100; } head;")
+        expected = FDKSyntaxFeatureWriter()
+        parseFeatures(expected, renameFeatureText(text, remap))
+        self.assertEqual(writer.write(), expected.write())
+
+    def testWriterNeedEnum(self):
+        writer = GlyphRenameFeatureWriter({"a" : "b"})
+        parseFeatures(writer, "enum pos a [c d] -10; sub a by a c;")
+        self.assertEqual(writer.write(), "enum pos b [c d] -10;\nsub b by b c;")
+
+
+class TestClassIndex(unittest.TestCase):
+
+    def makeIndex(self):
+        index = ClassIndex()
+        index.define("@ALL", ["@UC", "@LC", "zero"])
+        index.define("@UC", ["A", "B"])
+        index.define("@LC", ["a", ["b", "@UC"]])
+        index.define("@OTHER", ["x"])
+        return index
+
+    def testFlatten(self):
+        index = self.makeIndex()
+        self.assertEqual(index.flatten("@ALL"), ("A", "B", "a", "b", "A", "B", "zero"))
+        self.assertIs(index.flatten("@ALL"), index.flatten("@ALL"))
+        self.assertEqual(index.flattenItems(["q", "@UC", ["@OTHER", "r"]]), ["q", "A", "B", "x", "r"])
+        order = index.order()
+        self.assertEqual(sorted(order), ["@ALL", "@LC", "@OTHER", "@UC"])
+        self.assertLess(order.index("@UC"), order.index("@LC"))
+        self.assertLess(order.index("@LC"), order.index("@ALL"))
+
+    def testRedefine(self):
+        index = self.makeIndex()
+        other = index.flatten("@OTHER")
+        index.flatten("@ALL")
+        index.define("@UC", ["C"])
+        self.assertEqual(index.flatten("@ALL"), ("C", "a", "b", "C", "zero"))
+        self.assertIs(index.flatten("@OTHER"), other)
+        index.define("@LC", ["c"])
+        self.assertEqual(index.flatten("@ALL"), ("C", "c", "zero"))
+        index.define("@UC", ["D"])
+        self.assertEqual(index.flatten("@ALL"), ("D", "c", "zero"))
+
+    def testErrors(self):
+        index = self.makeIndex()
+        index.define("@UC", ["A", "@ALL"])
+        self.assertRaises(ValueError, index.flatten, "@LC")
+        self.assertRaises(ValueError, index.order)
+        index.define("@UC", ["@MISSING"])
+        self.assertRaises(KeyError, index.flatten, "@ALL")
+        self.assertRaises(KeyError, index.flatten, "@MISSING")
+
+    def testFeatestWriter(self):
+        index = self.makeIndex()
+        writer = FeatestWriter(index)
+        parseFeatures(writer, "@FIGS = [one two]; feature ss01 { sub @UC by @FIGS; } ss01;")
+        self.assertIn("@FIGS", index)
+        self.assertEqual(writer.write().splitlines()[-2:], ["> A B", "< one two"])
+
+
+class TestClassTable(unittest.TestCase):
+
+    text = """
+    @UC = [A B];
+    @LC = [a b];
+    feature ss01 {
+        @LC = [c @UC];
+        @ALL = [@LC @UC];
+        sub @LC by x;
+    } ss01;
+    sub @LC by y;
+    """
+
+    def testScopes(self):
+        test = self
+
+        class ClassTableWriter(AbstractFeatureWriter):
+
+            def __init__(self):
+                self.classTable = ClassTable()
+                self.found = []
+
+            def gsubType1(self, target, replacement):
+                table = self.classTable
+                test.assertIn("@UC", table)
+                self.found.append((
+                    table.flatten(target),
+                    table.isMember("A", target),
+                    table.classesContaining("A"),
+                    table.classesContaining("a"),
+                    "@ALL" in table,
+                ))
+
+        writer = ClassTableWriter()
+        parseFeatures(writer, self.text)
+        self.assertEqual(writer.found, [
+            (("c", "A", "B"), True, set(["@UC", "@LC", "@ALL"]), set(), True),
+            (("a", "b"), False, set(["@UC"]), set(["@LC"]), False),
+        ])
+        self.assertEqual(len(writer.classTable.scopes), 1)
+        self.assertEqual(writer.classTable.glyphSet("@LC"), frozenset(["a", "b"]))
+
+    def testErrors(self):
+        writer = AbstractFeatureWriter()
+        writer.classTable = ClassTable()
+        self.assertRaises(FeaToolsParserSyntaxError, parseFeatures, writer, "@A = [@B];")
+        writer.classTable = ClassTable()
+        self.assertRaises(FeaToolsParserSyntaxError, parseFeatures, writer, "feature x { @A = [a]; } x; @B = [@A];")
+        self.assertRaises(ValueError, ClassTable().closeScope)
+
+
+class TestGlyphSet(unittest.TestCase):
+
+    def testAlgebra(self):
+        table = GlyphNameTable(["x"])
+        arabic = GlyphSet(table, ["alef", "beh", "teh"])
+        joining = GlyphSet(table, ["theh", "teh", "beh"])
+        self.assertEqual(len(arabic), 3)
+        self.assertIn("beh", arabic)
+        self.assertNotIn("x", arabic)
+        self.assertNotIn("missing", arabic)
+        self.assertEqual((arabic & joining).glyphNames(), ["beh", "teh"])
+        self.assertEqual(list(arabic | joining), ["alef", "beh", "teh", "theh"])
+        self.assertEqual((arabic - joining).glyphNames(), ["alef"])
+        self.assertEqual((arabic ^ joining).glyphIds(), [1, 4])
+        self.assertEqual(arabic | ["x"], GlyphSet.fromIds(table, [0, 1, 2, 3]))
+        self.assertTrue(GlyphSet(table, ["beh"]) <= arabic)
+        self.assertTrue(arabic.isdisjoint(["x"]))
+        self.assertFalse(GlyphSet(table))
+        self.assertRaises(ValueError, arabic.union, GlyphSet(GlyphNameTable()))
+
+    def testEvents(self):
+        text = """
+        @UC = [A B];
+        feature ss01 {
+            @LC = [a @UC];
+            sub [@LC c] by x;
+            pos @LC [d A] 10;
+        } ss01;
+        sub [@UC] by [y z];
+        """
+        table = GlyphNameTable()
+        writer = TestFeatureWriter()
+        writer.glyphNameTable = table
+        writer.useGlyphSets = True
+        parseFeatures(writer, text)
+        expected = [
+            ("class", ("@UC", GlyphSet(table, ["A", "B"]))),
+            ("feature", ("ss01", [
+                ("class", ("@LC", GlyphSet(table, ["a", "A", "B"]))),
+                ("gsub type 1", (GlyphSet(table, ["a", "A", "B", "c"]), "x")),
+                ("gpos type 2", (["@LC", GlyphSet(table, ["d", "A"])], 10.0)),
+            ])),
+            ("gsub type 1", (GlyphSet(table, ["A", "B"]), GlyphSet(table, ["y", "z"]))),
+        ]
+        self.assertEqual(writer.getData(), expected)
+        writer = AbstractFeatureWriter()
+        writer.glyphNameTable = GlyphNameTable()
+        writer.useGlyphSets = True
+        self.assertRaises(FeaToolsParserSyntaxError, parseFeatures, writer, "feature x { @A = [a]; } x; sub [@A] by b;")
+
+
+class TestKerningExpansionWriter(unittest.TestCase):
+
+    text = """
+    @L = [A B];
+    @R = [V W];
+    feature kern {
+        pos @L @R -10;
+        pos A V -20;
+        pos @L [V X] -30;
+        enum pos B @R -40;
+        pos B V -50;
+        lookup local {
+            @L = [C];
+            pos @L V -60;
+        } local;
+    } kern;
+    """
+
+    def testExpand(self):
+        writer = KerningExpansionWriter()
+        parseFeatures(writer, self.text)
+        self.assertEqual(writer.kern("A", "V"), -20.0)
+        self.assertEqual(writer.kern("A", "W"), -10.0)
+        self.assertEqual(writer.kern("A", "X"), -30.0)
+        self.assertEqual(writer.kern("B", "V"), -40.0)
+        self.assertEqual(writer.kern("B", "W"), -40.0)
+        self.assertEqual(writer.kern("C", "V"), -60.0)
+        self.assertEqual(writer.kern("V", "A"), None)
+        self.assertEqual(writer.kern("A", "missing", 0), 0)
+        self.assertEqual(len(writer), 7)
+        self.assertEqual(list(writer.pairs())[:2], [("A", "V", -20.0), ("A", "W", -10.0)])
+
+    def testReplay(self):
+        recorder = RecordingFeatureWriter()
+        parseFeatures(recorder, self.text)
+        writer = KerningExpansionWriter()
+        recorder.replay(writer)
+        expected = KerningExpansionWriter()
+        parseFeatures(expected, self.text)
+        self.assertEqual(list(writer.pairs()), list(expected.pairs()))
+        writer = KerningExpansionWriter()
+        parseFeaturesToAST(self.text).walk(writer)
+        self.assertEqual(list(writer.pairs()), list(expected.pairs()))
+        writer = KerningExpansionWriter()
+        self.assertRaises(FeaToolsParserSyntaxError, writer.gposType2, ["@A", "b"], 10)
+        self.assertRaises(FeaToolsParserSyntaxError, parseFeatures, writer, "feature x { @A = [a]; } x; pos @A b 10;")
+
+    @unittest.skipIf(kerningExpansionWriter.numpy is None, "NumPy is not installed")
+    def testNumPy(self):
+        writer = KerningExpansionWriter()
+        parseFeatures(writer, makeCorpus("kerning", 0.01))
+        rules = writer._specificRules + writer._classRules
+        keys, values = kerningExpansionWriter._expandRulesWithNumPy(rules)
+        self.assertEqual(dict(zip(keys.tolist(), values.tolist())), kerningExpansionWriter._expandRules(rules))
+        self.assertEqual(keys.tolist(), sorted(keys.tolist()))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,24 @@
 class AbstractFeatureWriter(object):
 
+    # a writer can set glyphNameTable to a GlyphNameTable
+    # to get the table's copies of the glyph and class names
+    # from the parser. if useGlyphIds is True as well the
+    # names are passed as their ids in the table.
+    glyphNameTable = None
+    useGlyphIds = False
+
+    # if useGlyphSets is True the contents of class
+    # definitions and inline classes are passed as
+    # GlyphSets on the glyphNameTable, with the classes
+    # they use expanded. GlyphSets don't keep the order
+    # of the glyphs.
+    useGlyphSets = False
+
+    # a writer can set classTable to a ClassTable to
+    # have the parser define the classes in it, in the
+    # scope of the block they are defined in.
+    classTable = None
+
     def feature(self, name):
         return self
 
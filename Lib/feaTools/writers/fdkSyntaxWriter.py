@@ -1,11 +1,46 @@
 """
 Basic FDK syntax feature writer.
+
+The writer calls are recorded and only turned into text
+when write is called. The glyph lists given to the writer
+are copied, so the caller may change them after the call.
 """
 
 from __future__ import print_function, division, absolute_import, unicode_literals
 from .baseWriter import AbstractFeatureWriter
 
 
+# the number of arguments that follow each
+# formatting method name in the instructions
+_argumentCounts = {
+    "_formatTable" : 2,
+    "_formatFeatureReference" : 1,
+    "_formatLookupReference" : 1,
+    "_formatClassDefinition" : 2,
+    "_formatLookupFlag" : 4,
+    "_formatGsubType1" : 2,
+    "_formatGsubType2" : 2,
+    "_formatGsubType3" : 2,
+    "_formatGsubType4" : 2,
+    "_formatGsubType6" : 4,
+    "_formatGposType1" : 2,
+    "_formatGposType2" : 3,
+    "_formatLanguageSystem" : 2,
+    "_formatScript" : 1,
+    "_formatLanguage" : 2,
+    "_formatInclude" : 1,
+    "_formatRawText" : 1,
+    "_formatSubtableBreak" : 0,
+}
+
+
+def _copyItems(items):
+    # copy a glyph sequence and its inline classes
+    if isinstance(items, list):
+        return [_copyItems(item) for item in items]
+    return items
+
+
 class FDKSyntaxFeatureWriter(AbstractFeatureWriter):
 
     def __init__(self, name=None, isFeature=False):
@@ -14,28 +49,116 @@ class FDKSyntaxFeatureWriter(AbstractFeatureWriter):
         self._indentationLevel = 0
         self._instructions = []
 
-    def write(self, linesep="\n"):
-        lines = []
-        if self._name:
-            lines.append("")
-            if self._isFeature:
-                t = self._whitespace(self._indentationLevel-1) + "feature %s {" % self._name
-                lines.append(t)
-            else:
-                t = self._whitespace(self._indentationLevel-1) + "lookup %s {" % self._name
-                lines.append(t)
-        for instrution in self._instructions:
-            if isinstance(instrution, FDKSyntaxFeatureWriter):
-                t = instrution.write(linesep)
-                lines.append(t)
+    def write(self, linesep="\n", blocks=None):
+        """
+        Get the text. If blocks is given only the feature
+        and lookup blocks with names in blocks are written.
+        """
+        return linesep.join(self._iterLines(blocks))
+
+    def writeTo(self, f, linesep="\n", blocks=None):
+        """
+        Write the text that write would return to the file
+        object f, one line at a time. Nested feature and
+        lookup writers write their lines as they come, so
+        the whole text is never held in memory.
+        """
+        for text in self.iterText(linesep, blocks):
+            f.write(text)
+
+    def iterText(self, linesep="\n", blocks=None):
+        """
+        Yield the text that write would return in pieces.
+        """
+        first = True
+        for line in self._iterLines(blocks):
+            if first:
+                first = False
+                yield line
             else:
-               t = self._whitespace() + instrution
-               lines.append(t)
-        if self._name:
-            t = self._whitespace(self._indentationLevel-1) + "} %s;" % self._name
-            lines.append(t)
-            lines.append("")
-        return linesep.join(lines)
+                yield linesep + line
+
+    def _iterLines(self, blocks=None):
+        # the instructions are kept in one flat list of nested
+        # writers and formatting method names, each followed by
+        # the arguments for the method. they are only turned
+        # into text here. nested writers are handled with a
+        # stack rather than recursion.
+        if blocks is not None:
+            stack = [iter(self._instructions)]
+            while stack:
+                for instruction in stack[-1]:
+                    if not isinstance(instruction, FDKSyntaxFeatureWriter):
+                        continue
+                    if instruction._name in blocks:
+                        for line in instruction._iterLines():
+                            yield line
+                    else:
+                        stack.append(iter(instruction._instructions))
+                        break
+                else:
+                    stack.pop()
+            return
+        # the number of lines so far
+        lineCount = 0
+        for line in self._openingLines():
+            lineCount += 1
+            yield line
+        # [writer, index of the next instruction, formatters,
+        # line count when the writer was started, whitespace]
+        # for each open writer. formatters is a dictionary of
+        # formatting method name : (method, argument count)
+        stack = [[self, 0, {}, 0, self._whitespace()]]
+        while stack:
+            frame = stack[-1]
+            writer, index, formatters, startCount, whitespace = frame
+            instructions = writer._instructions
+            count = len(instructions)
+            nested = None
+            while index < count:
+                instruction = instructions[index]
+                if isinstance(instruction, FDKSyntaxFeatureWriter):
+                    nested = instruction
+                    index += 1
+                    break
+                formatter = formatters.get(instruction)
+                if formatter is None:
+                    formatter = formatters[instruction] = (getattr(writer, instruction), _argumentCounts[instruction])
+                method, argumentCount = formatter
+                start = index + 1
+                index = start + argumentCount
+                lineCount += 1
+                yield whitespace + method(*instructions[start:index])
+            if nested is not None:
+                frame[1] = index
+                stack.append([nested, 0, {}, lineCount, nested._whitespace()])
+                for line in nested._openingLines():
+                    lineCount += 1
+                    yield line
+                continue
+            stack.pop()
+            for line in writer._closingLines():
+                lineCount += 1
+                yield line
+            # a nested writer with no lines
+            # still takes up a line of its own.
+            if stack and lineCount == startCount:
+                lineCount += 1
+                yield ""
+
+    def _openingLines(self):
+        if not self._name:
+            return []
+        if self._isFeature:
+            keyword = "feature"
+        else:
+            keyword = "lookup"
+        return ["", self._whitespace(self._indentationLevel-1) + "%s %s {" % (keyword, self._name)]
+
+    def _closingLines(self):
+        if not self._name:
+            return []
+        return [self._whitespace(self._indentationLevel-1) + "} %s;" % self._name, ""]
 
     def _whitespace(self, level=None):
         if level is None:
@@ -65,19 +188,90 @@ class FDKSyntaxFeatureWriter(AbstractFeatureWriter):
         self._instructions.append(lookup)
         return lookup
 
+    def table(self, name, data):
+        data = [(tag, _copyItems(value)) for tag, value in data]
+        self._instructions.extend(("_formatTable", name, data))
+
     def featureReference(self, name):
-        t = "feature %s;" % name
-        self._instructions.append(t)
+        self._instructions.extend(("_formatFeatureReference", name))
 
     def lookupReference(self, name):
-        t = "lookup %s;" % name
-        self._instructions.append(t)
+        self._instructions.extend(("_formatLookupReference", name))
 
     def classDefinition(self, name, contents):
-        t = "%s = [%s];" % (name, self._list2String(contents))
-        self._instructions.append(t)
+        self._instructions.extend(("_formatClassDefinition", name, _copyItems(contents)))
 
     def lookupFlag(self, rightToLeft=False, ignoreBaseGlyphs=False, ignoreLigatures=False, ignoreMarks=False):
+        self._instructions.extend(("_formatLookupFlag", rightToLeft, ignoreBaseGlyphs, ignoreLigatures, ignoreMarks))
+
+    def gsubType1(self, target, replacement):
+        self._instructions.extend(("_formatGsubType1", _copyItems(target), _copyItems(replacement)))
+
+    def gsubType2(self, target, replacement):
+        self._instructions.extend(("_formatGsubType2", _copyItems(target), _copyItems(replacement)))
+
+    def gsubType3(self, target, replacement):
+        self._instructions.extend(("_formatGsubType3", _copyItems(target), _copyItems(replacement)))
+
+    def gsubType4(self, target, replacement):
+        self._instructions.extend(("_formatGsubType4", _copyItems(target), _copyItems(replacement)))
+
+    def gsubType6(self, precedingContext, target, trailingContext, replacement):
+        self._instructions.extend(("_formatGsubType6", _copyItems(precedingContext), _copyItems(target), _copyItems(trailingContext), _copyItems(replacement)))
+
+    def gposType1(self, target, value):
+        self._instructions.extend(("_formatGposType1", target, value))
+
+    def gposType2(self, target, value, needEnum=False):
+        self._instructions.extend(("_formatGposType2", _copyItems(target), value, needEnum))
+
+    def languageSystem(self, languageTag, scriptTag):
+        self._instructions.extend(("_formatLanguageSystem", languageTag, scriptTag))
+
+    def script(self, scriptTag):
+        self._instructions.extend(("_formatScript", scriptTag))
+
+    def language(self, languageTag, includeDefault=True):
+        self._instructions.extend(("_formatLanguage", languageTag, includeDefault))
+
+    def include(self, path):
+        self._instructions.extend(("_formatInclude", path))
+
+    def subtableBreak(self):
+        self._instructions.append("_formatSubtableBreak")
+
+    def rawText(self, text):
+        self._instructions.extend(("_formatRawText", text))
+
+    # ----------
+    # Formatting
+    # ----------
+
+    def _formatTable(self, name, data):
+        # the table is written on one line
+        parts = ["table", name, "{"]
+        for tag, value in data:
+            if isinstance(value, list):
+                value = " ".join(["%d" % i for i in value])
+            elif isinstance(value, float):
+                if tag == "FontRevision":
+                    value = "%.3f" % value
+                elif value == int(value):
+                    value = "%d" % value
+            parts.append("%s %s;" % (tag, value))
+        parts.append("} %s;" % name)
+        return " ".join(parts)
+
+    def _formatFeatureReference(self, name):
+        return "feature %s;" % name
+
+    def _formatLookupReference(self, name):
+        return "lookup %s;" % name
+
+    def _formatClassDefinition(self, name, contents):
+        return "%s = [%s];" % (name, self._list2String(contents))
+
+    def _formatLookupFlag(self, rightToLeft, ignoreBaseGlyphs, ignoreLigatures, ignoreMarks):
         values = []
         if rightToLeft:
             values.append("RightToLeft")
@@ -90,37 +284,34 @@ class FDKSyntaxFeatureWriter(AbstractFeatureWriter):
         if not values:
             values = "0"
         values = ", ".join(values)
-        t = "lookupflag %s;" % values
-        self._instructions.append(t)
+        return "lookupflag %s;" % values
 
-    def gsubType1(self, target, replacement):
+    def _formatGsubType1(self, target, replacement):
         if isinstance(target, list):
             target = "[%s]" % self._list2String(target)
         if isinstance(replacement, list):
             replacement = "[%s]" % self._list2String(replacement)
-        t = "sub %s by %s;" % (target, replacement)
-        self._instructions.append(t)
+        return "sub %s by %s;" % (target, replacement)
 
-    def gsubType2(self, target, replacement):
-        gsubType4(target, replacement)
-
-    def gsubType3(self, target, replacement):
+    def _formatGsubType3(self, target, replacement):
         if isinstance(target, list):
             target = "[%s]" % self._list2String(target)
         if isinstance(replacement, list):
             replacement = "[%s]" % self._list2String(replacement)
-        t = "sub %s from %s;" % (target, replacement)
-        self._instructions.append(t)
+        return "sub %s from %s;" % (target, replacement)
 
-    def gsubType4(self, target, replacement):
+    def _formatGsubType4(self, target, replacement):
         if isinstance(target, list):
             target = self._list2String(target)
         if isinstance(replacement, list):
             replacement = self._list2String(replacement)
-        t = "sub %s by %s;" % (target, replacement)
-        self._instructions.append(t)
+        return "sub %s by %s;" % (target, replacement)
 
-    def gsubType6(self, precedingContext, target, trailingContext, replacement):
+    def _formatGsubType2(self, target, replacement):
+        # sub a by b c; is written just like sub a b by c;
+        return self._formatGsubType4(target, replacement)
+
+    def _formatGsubType6(self, precedingContext, target, trailingContext, replacement):
         if isinstance(precedingContext, list):
             precedingContext = self._list2String(precedingContext)
         if isinstance(target, list):
@@ -156,14 +347,13 @@ class FDKSyntaxFeatureWriter(AbstractFeatureWriter):
                 t = "sub %s %s by %s;" % (target, trailingContext, replacement)
             else:
                 t = "sub %s by %s;" % (target, replacement)
-        self._instructions.append(t)
+        return t
 
-    def gposType1(self, target, value):
+    def _formatGposType1(self, target, value):
         value = "%d %d %d %d" % value
-        t = "pos %s <%s>;" % (target, value)
-        self._instructions.append(t)
+        return "pos %s <%s>;" % (target, value)
 
-    def gposType2(self, target, value, needEnum=False):
+    def _formatGposType2(self, target, value, needEnum):
         left, right = target
         if isinstance(left, list):
             left = "[%s]" % self._list2String(left)
@@ -172,31 +362,25 @@ class FDKSyntaxFeatureWriter(AbstractFeatureWriter):
         t = "pos %s %s %d;" % (left, right, value)
         if needEnum:
             t = "enum %s" % t
-        self._instructions.append(t)
+        return t
 
-    def languageSystem(self, languageTag, scriptTag):
-        t = "languagesystem %s %s;" % (scriptTag, languageTag)
-        self._instructions.append(t)
+    def _formatLanguageSystem(self, languageTag, scriptTag):
+        return "languagesystem %s %s;" % (scriptTag, languageTag)
 
-    def script(self, scriptTag):
-        t = "script %s;" % scriptTag
-        self._instructions.append(t)
+    def _formatScript(self, scriptTag):
+        return "script %s;" % scriptTag
 
-    def language(self, languageTag, includeDefault=True):
+    def _formatLanguage(self, languageTag, includeDefault):
         if not includeDefault and languageTag != "dflt":
-            t = "language %s exclude_dflt;" % languageTag
-        else:
-            t = "language %s;" % languageTag
-        self._instructions.append(t)
+            return "language %s exclude_dflt;" % languageTag
+        return "language %s;" % languageTag
 
-    def include(self, path):
-        t = "include(%s)" % path
-        self._instructions.append(t)
+    def _formatInclude(self, path):
+        return "include(%s)" % path
 
-    def subtableBreak(self):
-        t = "subtable;"
-        self._instructions.append(t)
+    def _formatSubtableBreak(self):
+        return "subtable;"
 
-    def rawText(self, text):
-        self._instructions.append(text)
+    def _formatRawText(self, text):
+        return text
 
@@ -4,12 +4,16 @@ Experimental .featest writer.
 
 from __future__ import print_function, division, absolute_import, unicode_literals
 from .baseWriter import AbstractFeatureWriter
+from ..classes import ClassIndex
 
 
 class FeatestWriter(object):
 
-    def __init__(self):
-        self._classes = {}
+    def __init__(self, classIndex=None):
+        # the index can be shared with other writers
+        if classIndex is None:
+            classIndex = ClassIndex()
+        self.classIndex = classIndex
         self._tests = []
         self._currentFeature = None
 
@@ -20,11 +24,7 @@ class FeatestWriter(object):
         if isinstance(item, list):
             item = item[0]
         if item.startswith("@"):
-            contents = []
-            for i in self._classes[item]:
-                i = self._flatten(i)
-                contents.extend(i)
-            item = contents
+            item = list(self.classIndex.flatten(item))
         else:
             item = [item]
         return item
@@ -44,7 +44,7 @@ class FeatestWriter(object):
         return self
 
     def classDefinition(self, name, contents):
-        self._classes[name] = contents
+        self.classIndex.define(name, contents)
 
     def gsubType1(self, target, replacement):
         target = self._flatten(target)
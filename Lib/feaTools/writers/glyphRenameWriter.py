@@ -1,36 +1,44 @@
 """
 This writer lets you rename glyphs and output text in FDK syntax.
 To rename glyphs, pass a dictionary of {beforeName:afterName} as the
-remap argument in the constructor.
+remap argument in the constructor. remap can also be a GlyphRemap
+with prefix and regular expression rules.
+
+The writer outputs the file in its own layout. To keep the layout,
+comments and strings of a file and only change the glyph names,
+use parser.renameFeatureText instead.
 """
 
 from __future__ import print_function, division, absolute_import, unicode_literals
 from .fdkSyntaxWriter import FDKSyntaxFeatureWriter
-
-
-try:
-    basestring
-except NameError:
-    basestring = str
+from ..glyphRemap import GlyphRemap
 
 
 class GlyphRenameFeatureWriter(FDKSyntaxFeatureWriter):
 
     def __init__(self, remap, name=None, isFeature=False):
-        self._map = remap
+        # the GlyphRemap remembers every name it renames, so
+        # renaming the same glyphs in many calls is cheap.
+        if not isinstance(remap, GlyphRemap):
+            remap = GlyphRemap(remap)
+        self._remap = remap
         super(GlyphRenameFeatureWriter, self).__init__(name=name, isFeature=isFeature)
 
     def _rename(self, glyphList):
-        if glyphList is None:
-            return None
-        if isinstance(glyphList, basestring):
-            return self._map.get(glyphList, glyphList)
-        return [self._rename(glyphName) for glyphName in glyphList]
+        return self._remap.renameItems(glyphList)
 
     def _subwriter(self, name, isFeature):
-        return GlyphRenameFeatureWriter(self._map, name, isFeature=isFeature)
+        return GlyphRenameFeatureWriter(self._remap, name, isFeature=isFeature)
+
+    def table(self, name, data):
+        # the glyph classes in GDEF are source text
+        if name == "GDEF":
+            renameText = self._remap.renameText
+            data = [(tag, renameText(value) if tag == "GlyphClassDef" else value) for tag, value in data]
+        super(GlyphRenameFeatureWriter, self).table(name, data)
 
     def classDefinition(self, name, contents):
+        name = self._rename(name)
         contents = self._rename(contents)
         super(GlyphRenameFeatureWriter, self).classDefinition(name, contents)
 
@@ -39,6 +47,11 @@ class GlyphRenameFeatureWriter(FDKSyntaxFeatureWriter):
         replacement = self._rename(replacement)
         super(GlyphRenameFeatureWriter, self).gsubType1(target, replacement)
 
+    def gsubType2(self, target, replacement):
+        target = self._rename(target)
+        replacement = self._rename(replacement)
+        super(GlyphRenameFeatureWriter, self).gsubType2(target, replacement)
+
     def gsubType3(self, target, replacement):
         target = self._rename(target)
         replacement = self._rename(replacement)
@@ -57,9 +70,10 @@ class GlyphRenameFeatureWriter(FDKSyntaxFeatureWriter):
         super(GlyphRenameFeatureWriter, self).gsubType6(precedingContext, target, trailingContext, replacement)
 
     def gposType1(self, target, value):
-        target = self._rename(target)
+        # the target is source text, such as [a b]
+        target = self._remap.renameText(target)
         super(GlyphRenameFeatureWriter, self).gposType1(target, value)
 
     def gposType2(self, target, value, needEnum=False):
         target = self._rename(target)
-        super(GlyphRenameFeatureWriter, self).gposType2(target, value)
+        super(GlyphRenameFeatureWriter, self).gposType2(target, value, needEnum)
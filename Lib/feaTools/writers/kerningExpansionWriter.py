@@ -0,0 +1,208 @@
+"""
+This writer expands pair kerning (gposType2) into the value
+for every pair of glyphs:
+
+    writer = KerningExpansionWriter()
+    parseFeatures(writer, myFeatureText)
+    writer.kern("A", "V")
+
+Glyph pairs and enum pairs are specific pairs and come before
+class pairs. Within each kind the first rule for a pair wins. A
+pair of a glyph and a class is a class pair unless it is written
+with enum.
+
+This is a simplified model. All of the rules are merged into one
+table, with the first rule winning, wherever they are. In a font,
+pairs from separate lookups add together and a subtable break
+changes which rule applies, so the values can differ from what
+a font built from the same features does.
+
+The writer keeps the class definitions itself. The writers that
+feature and lookup return see the classes of the writer that
+made them plus the classes defined in their block. The expanded
+pairs are kept by a key made from the ids of the two glyphs in
+the writer's glyphNameTable. Without NumPy the keys are in a
+dictionary. With NumPy all of the rules are expanded in one pass
+into sorted arrays of keys and values, and pairs are looked up
+with a binary search.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+from .baseWriter import AbstractFeatureWriter
+from ..classes import ClassIndex
+from ..glyphNameTable import GlyphNameTable
+from ..parser import FeaToolsParserSyntaxError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the left glyph id is shifted by this many
+# bits in the key for a pair of glyph ids.
+_keyShift = 32
+_rightMask = (1 << _keyShift) - 1
+
+
+def _isGlyph(item):
+    return not isinstance(item, list) and not item.startswith("@")
+
+def _expandRules(rules):
+    # the rules are in order of precedence. later rules are
+    # written first so that the earlier ones replace them.
+    pairs = {}
+    for leftIds, rightIds, value in reversed(rules):
+        for leftId in leftIds:
+            base = leftId << _keyShift
+            pairs.update(dict.fromkeys([base | rightId for rightId in rightIds], value))
+    return pairs
+
+def _expandRulesWithNumPy(rules):
+    # returns sorted arrays of keys and values.
+    # every rule is a block of len(left) * len(right)
+    # pairs, in order of precedence.
+    if not rules:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)
+    leftCounts = numpy.array([len(leftIds) for leftIds, rightIds, value in rules], dtype=numpy.int64)
+    rightCounts = numpy.array([len(rightIds) for leftIds, rightIds, value in rules], dtype=numpy.int64)
+    ruleValues = numpy.array([value for leftIds, rightIds, value in rules], dtype=numpy.float64)
+    leftIds = numpy.fromiter((glyphId for rule in rules for glyphId in rule[0]), dtype=numpy.int64, count=int(leftCounts.sum()))
+    rightIds = numpy.fromiter((glyphId for rule in rules for glyphId in rule[1]), dtype=numpy.int64, count=int(rightCounts.sum()))
+    leftStarts = numpy.cumsum(leftCounts) - leftCounts
+    rightStarts = numpy.cumsum(rightCounts) - rightCounts
+    sizes = leftCounts * rightCounts
+    pairStarts = numpy.cumsum(sizes) - sizes
+    # the rule of each pair and its place within the rule
+    ruleIndexes = numpy.repeat(numpy.arange(len(rules)), sizes)
+    offsets = numpy.arange(int(sizes.sum()), dtype=numpy.int64) - pairStarts[ruleIndexes]
+    ruleRightCounts = rightCounts[ruleIndexes]
+    left = leftIds[leftStarts[ruleIndexes] + offsets // ruleRightCounts]
+    right = rightIds[rightStarts[ruleIndexes] + offsets % ruleRightCounts]
+    keys = (left << _keyShift) | right
+    # a stable sort keeps the pairs of each key in order
+    # of precedence, so the first one of each key wins.
+    order = numpy.argsort(keys, kind="stable")
+    keys = keys[order]
+    first = numpy.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return keys[first], ruleValues[ruleIndexes[order[first]]]
+
+
+class KerningExpansionWriter(AbstractFeatureWriter):
+
+    def __init__(self, glyphNameTable=None, _parent=None):
+        if _parent is not None:
+            # block writers add their rules to
+            # the writer at the top.
+            self._root = _parent._root
+            self.glyphNameTable = _parent.glyphNameTable
+            self.classIndex = ClassIndex(parent=_parent.classIndex)
+            return
+        if glyphNameTable is None:
+            glyphNameTable = GlyphNameTable()
+        self._root = self
+        self.glyphNameTable = glyphNameTable
+        self.classIndex = ClassIndex()
+        # (left glyph ids, right glyph ids, value)
+        # for each rule, in order.
+        self._specificRules = []
+        self._classRules = []
+        # pair key : value, or sorted arrays of
+        # keys and values with NumPy. made when needed.
+        self._pairs = None
+        self._keys = None
+        self._values = None
+
+    def __len__(self):
+        self.expand()
+        root = self._root
+        if root._keys is not None:
+            return len(root._keys)
+        return len(root._pairs)
+
+    def _glyphIds(self, item):
+        try:
+            glyphNames = self.classIndex.flattenItems(item)
+        except KeyError as error:
+            raise FeaToolsParserSyntaxError("Undefined class: %s" % error.args[0])
+        except ValueError as error:
+            raise FeaToolsParserSyntaxError(str(error))
+        glyphId = self.glyphNameTable.glyphId
+        return [glyphId(glyphName) for glyphName in glyphNames]
+
+    # --------------
+    # Writer Methods
+    # --------------
+
+    def feature(self, name):
+        return KerningExpansionWriter(_parent=self)
+
+    def lookup(self, name):
+        return KerningExpansionWriter(_parent=self)
+
+    def classDefinition(self, name, contents):
+        self.classIndex.define(name, contents)
+
+    def gposType2(self, target, value, needEnum=False):
+        left, right = target
+        rule = (self._glyphIds(left), self._glyphIds(right), value)
+        root = self._root
+        if needEnum or (_isGlyph(left) and _isGlyph(right)):
+            root._specificRules.append(rule)
+        else:
+            root._classRules.append(rule)
+        root._pairs = None
+        root._keys = None
+        root._values = None
+
+    # ------
+    # Access
+    # ------
+
+    def expand(self):
+        """
+        Expand the rules into pairs. This is done
+        when the pairs are first asked for.
+        """
+        root = self._root
+        if root._pairs is not None or root._keys is not None:
+            return
+        rules = root._specificRules + root._classRules
+        if numpy is not None:
+            root._keys, root._values = _expandRulesWithNumPy(rules)
+        else:
+            root._pairs = _expandRules(rules)
+
+    def kern(self, left, right, default=None):
+        """
+        Get the value for a pair of glyph names.
+        """
+        leftId = self.glyphNameTable.getGlyphId(left)
+        rightId = self.glyphNameTable.getGlyphId(right)
+        if leftId is None or rightId is None:
+            return default
+        self.expand()
+        root = self._root
+        key = leftId << _keyShift | rightId
+        if root._keys is None:
+            return root._pairs.get(key, default)
+        index = numpy.searchsorted(root._keys, key)
+        if index == len(root._keys) or root._keys[index] != key:
+            return default
+        return float(root._values[index])
+
+    def pairs(self):
+        """
+        Yield (left, right, value) for every expanded
+        pair, ordered by the glyph ids.
+        """
+        glyphName = self.glyphNameTable.glyphName
+        self.expand()
+        root = self._root
+        if root._keys is None:
+            pairs = root._pairs
+            items = ((key, pairs[key]) for key in sorted(pairs))
+        else:
+            items = zip(root._keys.tolist(), root._values.tolist())
+        for key, value in items:
+            yield (glyphName(key >> _keyShift), glyphName(key & _rightMask), value)
@@ -0,0 +1,205 @@
+"""
+This writer collects pair kerning (gposType2) into compact
+columns of glyph ids:
+
+    writer = KerningTableWriter()
+    parseFeatures(writer, myFeatureText)
+    writer.kern("A", "V")
+    writer.dedupe()
+    myKerningText = writer.write()
+
+Glyph and class names are ids in a GlyphNameTable, which can be
+shared with other writers. Inline classes ([a b c]) get negative
+ids. The left and right ids, the values and the enum flags are
+kept in arrays, so a pair takes 17 bytes. Calls other than
+gposType2 are ignored.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+from array import array
+from bisect import bisect_left
+from .baseWriter import AbstractFeatureWriter
+from .fdkSyntaxWriter import FDKSyntaxFeatureWriter
+from ..glyphNameTable import GlyphNameTable
+
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+_keyOffset = 2 ** 31
+
+
+class KerningTableWriter(AbstractFeatureWriter):
+
+    useGlyphIds = True
+
+    def __init__(self, glyphNameTable=None):
+        if glyphNameTable is None:
+            glyphNameTable = GlyphNameTable()
+        self.glyphNameTable = glyphNameTable
+        self.left = array("i")
+        self.right = array("i")
+        self.value = array("d")
+        self.enum = array("b")
+        # the glyph ids of each inline class. inline
+        # class n has the id -(n + 1).
+        self._inlineClasses = []
+        self._inlineClassIds = {}
+        # pair keys in (left, right) order and the row
+        # of each key. made when a pair is looked up.
+        self._keys = None
+        self._rows = None
+
+    def __len__(self):
+        return len(self.left)
+
+    # ---
+    # Ids
+    # ---
+
+    def _itemId(self, item):
+        # items are ids from the parser, or names or
+        # lists of names from other callers.
+        if isinstance(item, list):
+            glyphIds = tuple(self._itemId(glyphName) for glyphName in item)
+            itemId = self._inlineClassIds.get(glyphIds)
+            if itemId is None:
+                self._inlineClasses.append(glyphIds)
+                itemId = -len(self._inlineClasses)
+                self._inlineClassIds[glyphIds] = itemId
+            return itemId
+        if isinstance(item, basestring):
+            return self.glyphNameTable.glyphId(item)
+        return item
+
+    def _getItemId(self, item):
+        # like _itemId but doesn't add anything
+        if isinstance(item, list):
+            glyphIds = []
+            for glyphName in item:
+                glyphId = self._getItemId(glyphName)
+                if glyphId is None:
+                    return None
+                glyphIds.append(glyphId)
+            return self._inlineClassIds.get(tuple(glyphIds))
+        if isinstance(item, basestring):
+            return self.glyphNameTable.getGlyphId(item)
+        return item
+
+    def _itemName(self, itemId):
+        if itemId < 0:
+            return [self.glyphNameTable.glyphName(glyphId) for glyphId in self._inlineClasses[-itemId - 1]]
+        return self.glyphNameTable.glyphName(itemId)
+
+    # -------------
+    # Writer Method
+    # -------------
+
+    def gposType2(self, target, value, needEnum=False):
+        left, right = target
+        self.left.append(self._itemId(left))
+        self.right.append(self._itemId(right))
+        self.value.append(value)
+        self.enum.append(bool(needEnum))
+        self._keys = None
+
+    # ------
+    # Access
+    # ------
+
+    def pairs(self):
+        """
+        Yield (left, right, value, needEnum) for every pair
+        in order. Inline classes are lists of glyph names.
+        """
+        itemName = self._itemName
+        for index in range(len(self.left)):
+            yield (itemName(self.left[index]), itemName(self.right[index]), self.value[index], bool(self.enum[index]))
+
+    def _pairKeys(self):
+        # one int per pair that sorts like (left, right)
+        return [left * 2 ** 32 + right + _keyOffset for left, right in zip(self.left, self.right)]
+
+    def _sortedRows(self, keys):
+        # row indexes in (left, right) order. rows with
+        # the same pair stay in their original order.
+        return sorted(range(len(keys)), key=keys.__getitem__)
+
+    def _makeIndex(self):
+        keys = self._pairKeys()
+        rows = self._sortedRows(keys)
+        self._rows = array("i", rows)
+        self._keys = array("q", [keys[index] for index in rows])
+
+    def kern(self, left, right, default=None):
+        """
+        Get the value of the first pair for left and right.
+        These are glyph or class names, or lists of glyph
+        names for inline classes. Pairs are only matched
+        as they were written, classes are not expanded.
+        """
+        left = self._getItemId(left)
+        right = self._getItemId(right)
+        if left is None or right is None:
+            return default
+        if self._keys is None:
+            self._makeIndex()
+        key = left * 2 ** 32 + right + _keyOffset
+        position = bisect_left(self._keys, key)
+        if position == len(self._keys) or self._keys[position] != key:
+            return default
+        return self.value[self._rows[position]]
+
+    # -------
+    # Editing
+    # -------
+
+    def _reorder(self, rows):
+        self.left = array("i", [self.left[index] for index in rows])
+        self.right = array("i", [self.right[index] for index in rows])
+        self.value = array("d", [self.value[index] for index in rows])
+        self.enum = array("b", [self.enum[index] for index in rows])
+        self._keys = None
+
+    def sort(self):
+        """
+        Sort the pairs by left and right id. Pairs with
+        the same left and right stay in their order.
+        """
+        self._reorder(self._sortedRows(self._pairKeys()))
+
+    def dedupe(self):
+        """
+        Remove all but the first pair for each left and right.
+        The order of the remaining pairs is kept.
+        """
+        seen = set()
+        rows = []
+        for index, key in enumerate(self._pairKeys()):
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(index)
+        if len(rows) != len(self.left):
+            self._reorder(rows)
+
+    # ------
+    # Output
+    # ------
+
+    def replay(self, writer):
+        """
+        Make a gposType2 call on writer for every pair.
+        """
+        for left, right, value, needEnum in self.pairs():
+            writer.gposType2([left, right], value, needEnum)
+
+    def write(self, linesep="\n"):
+        """
+        Get the pairs as FDK syntax pos statements.
+        """
+        writer = FDKSyntaxFeatureWriter()
+        self.replay(writer)
+        return writer.write(linesep)
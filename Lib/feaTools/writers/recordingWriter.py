@@ -0,0 +1,263 @@
+"""
+This writer records every call made to it in a compact log
+and can replay the calls into any other writer. This lets a
+feature file be parsed once and passed to many writers:
+
+    recorder = RecordingFeatureWriter()
+    parseFeatures(recorder, myFeatureText)
+    fdkWriter = FDKSyntaxFeatureWriter()
+    recorder.replay(fdkWriter)
+    renameWriter = GlyphRenameFeatureWriter(myRemap)
+    recorder.replay(renameWriter)
+
+The log is a flat array of ints. Glyph and class names are
+stored once, in a GlyphNameTable, and referred to by id. Other
+strings (tags, paths, raw text) are kept once in a list of the
+log's own, so they don't get glyph ids. Floats are kept in a
+separate array. A table can be shared with other writers by
+passing it to the constructor.
+"""
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+from array import array
+from .baseWriter import AbstractFeatureWriter
+from ..glyphNameTable import GlyphNameTable
+from ..parser import _glyphArguments
+
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+
+# the writer methods in opcode order
+_methodNames = (
+    "feature",
+    "lookup",
+    "table",
+    "featureReference",
+    "lookupReference",
+    "classDefinition",
+    "lookupFlag",
+    "gsubType1",
+    "gsubType2",
+    "gsubType3",
+    "gsubType4",
+    "gsubType6",
+    "gposType1",
+    "gposType2",
+    "languageSystem",
+    "script",
+    "language",
+    "include",
+    "subtableBreak",
+    "rawText",
+)
+_opcodes = dict((methodName, opcode) for opcode, methodName in enumerate(_methodNames))
+_blockOpcodes = frozenset([_opcodes["feature"], _opcodes["lookup"]])
+
+# value tags
+_STRING = 0
+_LIST = 1
+_TUPLE = 2
+_FLOAT = 3
+_INT = 4
+_NONE = 5
+_TRUE = 6
+_FALSE = 7
+_GLYPH = 8
+
+
+class _RecordingLog(object):
+
+    def __init__(self, glyphNameTable):
+        # opcode, block id, argument count, arguments...
+        self.records = array("i")
+        self.floats = array("d")
+        # strings that aren't glyph or class names
+        self.strings = []
+        self._stringIds = {}
+        self.glyphNameTable = glyphNameTable
+        self.blockCount = 1
+
+    def encode(self, value, isGlyph=False):
+        # strings in glyph arguments get ids in the
+        # glyph name table. other strings go in strings.
+        records = self.records
+        if isinstance(value, basestring):
+            if isGlyph:
+                records.append(_GLYPH)
+                records.append(self.glyphNameTable.glyphId(value))
+            else:
+                stringId = self._stringIds.get(value)
+                if stringId is None:
+                    stringId = self._stringIds[value] = len(self.strings)
+                    self.strings.append(value)
+                records.append(_STRING)
+                records.append(stringId)
+        elif isinstance(value, list):
+            records.append(_LIST)
+            records.append(len(value))
+            for item in value:
+                self.encode(item, isGlyph)
+        elif isinstance(value, tuple):
+            records.append(_TUPLE)
+            records.append(len(value))
+            for item in value:
+                self.encode(item, isGlyph)
+        elif value is None:
+            records.append(_NONE)
+        elif value is True:
+            records.append(_TRUE)
+        elif value is False:
+            records.append(_FALSE)
+        elif isinstance(value, int):
+            records.append(_INT)
+            records.append(value)
+        else:
+            records.append(_FLOAT)
+            records.append(len(self.floats))
+            self.floats.append(value)
+
+    def decode(self, index):
+        # returns the value starting at
+        # index and the index after it.
+        records = self.records
+        tag = records[index]
+        index += 1
+        if tag == _GLYPH:
+            return self.glyphNameTable.glyphName(records[index]), index + 1
+        if tag == _STRING:
+            return self.strings[records[index]], index + 1
+        if tag == _LIST or tag == _TUPLE:
+            count = records[index]
+            index += 1
+            items = []
+            for i in range(count):
+                item, index = self.decode(index)
+                items.append(item)
+            if tag == _TUPLE:
+                items = tuple(items)
+            return items, index
+        if tag == _FLOAT:
+            return self.floats[records[index]], index + 1
+        if tag == _INT:
+            return records[index], index + 1
+        if tag == _NONE:
+            return None, index
+        return tag == _TRUE, index
+
+    def record(self, methodName, blockId, arguments):
+        records = self.records
+        records.append(_opcodes[methodName])
+        records.append(blockId)
+        records.append(len(arguments))
+        glyphPositions = _glyphArguments.get(methodName, ())
+        for position, argument in enumerate(arguments):
+            self.encode(argument, position in glyphPositions)
+
+
+class RecordingFeatureWriter(AbstractFeatureWriter):
+
+    def __init__(self, glyphNameTable=None, _log=None, _blockId=0):
+        if _log is None:
+            if glyphNameTable is None:
+                glyphNameTable = GlyphNameTable()
+            _log = _RecordingLog(glyphNameTable)
+        self._log = _log
+        self._blockId = _blockId
+        self.glyphNameTable = _log.glyphNameTable
+
+    def replay(self, writer):
+        """
+        Make the recorded calls on writer.
+        """
+        log = self._log
+        records = log.records
+        # writers by block id
+        writers = [writer]
+        index = 0
+        count = len(records)
+        while index < count:
+            opcode = records[index]
+            blockWriter = writers[records[index + 1]]
+            argumentCount = records[index + 2]
+            index += 3
+            arguments = []
+            for i in range(argumentCount):
+                argument, index = log.decode(index)
+                arguments.append(argument)
+            result = getattr(blockWriter, _methodNames[opcode])(*arguments)
+            if opcode in _blockOpcodes:
+                writers.append(result)
+
+    def _record(self, methodName, *arguments):
+        self._log.record(methodName, self._blockId, arguments)
+
+    def _block(self, methodName, name):
+        log = self._log
+        self._record(methodName, name)
+        blockId = log.blockCount
+        log.blockCount += 1
+        return RecordingFeatureWriter(_log=log, _blockId=blockId)
+
+    def feature(self, name):
+        return self._block("feature", name)
+
+    def lookup(self, name):
+        return self._block("lookup", name)
+
+    def table(self, name, data):
+        self._record("table", name, data)
+
+    def featureReference(self, name):
+        self._record("featureReference", name)
+
+    def lookupReference(self, name):
+        self._record("lookupReference", name)
+
+    def classDefinition(self, name, contents):
+        self._record("classDefinition", name, contents)
+
+    def lookupFlag(self, rightToLeft=False, ignoreBaseGlyphs=False, ignoreLigatures=False, ignoreMarks=False):
+        self._record("lookupFlag", rightToLeft, ignoreBaseGlyphs, ignoreLigatures, ignoreMarks)
+
+    def gsubType1(self, target, replacement):
+        self._record("gsubType1", target, replacement)
+
+    def gsubType2(self, target, replacement):
+        self._record("gsubType2", target, replacement)
+
+    def gsubType3(self, target, replacement):
+        self._record("gsubType3", target, replacement)
+
+    def gsubType4(self, target, replacement):
+        self._record("gsubType4", target, replacement)
+
+    def gsubType6(self, precedingContext, target, trailingContext, replacement):
+        self._record("gsubType6", precedingContext, target, trailingContext, replacement)
+
+    def gposType1(self, target, value):
+        self._record("gposType1", target, value)
+
+    def gposType2(self, target, value, needEnum=False):
+        self._record("gposType2", target, value, needEnum)
+
+    def languageSystem(self, languageTag, scriptTag):
+        self._record("languageSystem", languageTag, scriptTag)
+
+    def script(self, scriptTag):
+        self._record("script", scriptTag)
+
+    def language(self, languageTag, includeDefault=True):
+        self._record("language", languageTag, includeDefault)
+
+    def include(self, path):
+        self._record("include", path)
+
+    def subtableBreak(self):
+        self._record("subtableBreak")
+
+    def rawText(self, text):
+        self._record("rawText", text)
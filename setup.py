@@ -12,6 +12,7 @@ setup(name = "feaTools",
       packages = [
               "feaTools",
               "feaTools.writers",
+              "feaTools.benchmark",
       ],
       package_dir = {"":"Lib"},
 )